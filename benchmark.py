@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8, vim: expandtab:ts=4 -*-
+###############################################################################
+# Copyright (c) 2015 Móréh, Tamás
+# All rights reserved. This program and the accompanying materials
+# are made available under the terms of the GNU Lesser Public License v3
+# which accompanies this distribution, and is available at
+# http://www.gnu.org/licenses/
+#
+# This file is part of PurePos-Python3.
+#
+# PurePos-Python3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PurePos-Python3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser Public License for more details.
+#
+# Contributors:
+#     Móréh, Tamás - initial API and implementation
+##############################################################################
+
+__author__ = 'morta@digitus.itk.ppke.hu'
+
+import argparse
+import math
+import sys
+import time
+from corpusreader.corpus_reader import CorpusReader
+from corpusreader.tokenreaders import StemmedTaggedTokenReader
+from purepos.common.serializer import StandardSerializer
+from purepos.cli.configuration import Configuration
+from purepos.morphology import BaseMorphologicalAnalyser
+from purepos.tagger import POSTagger
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Compare the speed and the POS tag accuracy of "
+                                                 "the Viterbi and the Beam Search decoders on an "
+                                                 "annotated corpus.")
+    parser.add_argument("-m", "--model", help="The model file.", metavar="<modelfile>",
+                        required=True)
+    parser.add_argument("-i", "--input-file", help="Annotated corpus in word#lemma#tag format.",
+                        metavar="<file>", required=True)
+    parser.add_argument("-c", "--encoding", help="Encoding of the corpus. The default is utf-8.",
+                        metavar="<encoding>", default="utf-8")
+    parser.add_argument("-s", "--beam-sizes", help="Beam sizes of the Beam Search decoder to "
+                                                   "measure. The default is 1 5 10 50.",
+                        metavar="<number>", type=int, nargs="+", default=[1, 5, 10, 50])
+    parser.add_argument("-b", "--beam-theta", help="The beam-search limit. The default is 1000.",
+                        metavar="<theta>", type=int, default=1000)
+    parser.add_argument("-g", "--max-guessed", help="Limit the max guessed tags for each token. "
+                                                    "The default is 10.",
+                        metavar="<number>", type=int, default=10)
+    return parser.parse_args()
+
+
+def measure(tagger: POSTagger, sentences: list, gold: list) -> tuple:
+    start = time.perf_counter()
+    tagged = [tagger.tag_sentence(sentence, 1)[0] for sentence in sentences]
+    elapsed = time.perf_counter() - start
+    correct = sum(token.tag == gold_tag
+                  for sentence, gold_tags in zip(tagged, gold)
+                  for token, gold_tag in zip(sentence, gold_tags))
+    return elapsed, correct
+
+
+def main():
+    options = parse_arguments()
+    with open(options.input_file, encoding=options.encoding) as source:
+        document = CorpusReader(StemmedTaggedTokenReader()).read_from_io(source)
+    sentences = [[token.token for token in sentence] for sentence in document.sentences()]
+    gold = [[token.tag for token in sentence] for sentence in document.sentences()]
+    tokens = sum(len(sentence) for sentence in sentences)
+    model = StandardSerializer.read_model(options.model).compile(Configuration())
+    log_theta = math.log(options.beam_theta)
+    suf_theta = math.log(10)
+    ma = BaseMorphologicalAnalyser()
+
+    runs = [("viterbi", POSTagger(model, ma, log_theta, suf_theta, options.max_guessed, False))]
+    for size in options.beam_sizes:
+        runs.append(("beam-{}".format(size),
+                     POSTagger(model, ma, log_theta, suf_theta, options.max_guessed, True,
+                               beam_width=size)))
+    print("{} sentences, {} tokens".format(len(sentences), tokens))
+    print("{:<12}{:>10}{:>14}{:>10}".format("decoder", "time (s)", "tokens/s", "accuracy"))
+    for name, tagger in runs:
+        elapsed, correct = measure(tagger, sentences, gold)
+        print("{:<12}{:>10.2f}{:>14.0f}{:>10.4f}".format(name, elapsed, tokens / elapsed,
+                                                         correct / tokens))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nBye!", file=sys.stderr)
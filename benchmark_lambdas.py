@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8, vim: expandtab:ts=4 -*-
+###############################################################################
+# Copyright (c) 2015 Móréh, Tamás
+# All rights reserved. This program and the accompanying materials
+# are made available under the terms of the GNU Lesser Public License v3
+# which accompanies this distribution, and is available at
+# http://www.gnu.org/licenses/
+#
+# This file is part of PurePos-Python3.
+#
+# PurePos-Python3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PurePos-Python3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser Public License for more details.
+#
+# Contributors:
+#     Móréh, Tamás - initial API and implementation
+##############################################################################
+
+__author__ = 'morta@digitus.itk.ppke.hu'
+
+import argparse
+import sys
+import time
+from purepos.common.serializer import StandardSerializer
+from purepos.model.ngrammodel import NGramModel
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Measure the deleted interpolation lambda "
+                                                 "computation of the n-gram models of a trained "
+                                                 "model, and compare it to the recursive "
+                                                 "reference implementation.")
+    parser.add_argument("-m", "--model", help="The model file.", metavar="<modelfile>",
+                        required=True)
+    parser.add_argument("-r", "--repeat", help="Number of measurements, the best is printed. "
+                                               "The default is 3.",
+                        metavar="<number>", type=int, default=3)
+    return parser.parse_args()
+
+
+def reference_lambdas(model: NGramModel) -> list:
+    # A korábbi rekurzív bejárás: minden levél minden szavára find_max az egész úton.
+    lambdas = [0.0 for _ in range(0, model.n + 1, 1)]
+
+    def iterate(node, acc: list):
+        acc.append(node)
+        if node.child_nodes is None or len(node.child_nodes) == 0:
+            for word in node.words.keys():
+                mx = max([(i, NGramModel.modified_freq_val(n.num, n.words[word]))
+                          for i, n in enumerate(acc)], key=lambda p: p[1])
+                if mx[1] != -1:
+                    lambdas[mx[0] + 1] = lambdas[mx[0] + 1] + node.words.get(word)
+        else:
+            for child in node.child_nodes.values():
+                iterate(child, acc)
+        acc.pop()
+
+    iterate(model.root, [])
+    s = sum(lambdas)
+    if s > 0:
+        lambdas = [l / s for l in lambdas]
+    return lambdas
+
+
+def best_time(function, repeat: int) -> tuple:
+    best = None
+    ret = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ret = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, ret
+
+
+def trie_size(node) -> int:
+    stack = [node]
+    ret = 0
+    while len(stack) > 0:
+        node = stack.pop()
+        ret += len(node.words)
+        stack.extend(node.child_nodes.values())
+    return ret
+
+
+def main():
+    options = parse_arguments()
+    raw_model_data = StandardSerializer.read_model(options.model).raw_model_data
+    models = [("tag", raw_model_data.tag_ngram_model),
+              ("emission", raw_model_data.std_emission_ngram_model),
+              ("spec", raw_model_data.spec_emission_ngram_model)]
+    print("{:<10}{:>12}{:>16}{:>12}{:>10}".format("model", "trie items", "reference (s)",
+                                                  "new (s)", "equal"))
+    for name, model in models:
+        ref_time, ref = best_time(lambda: reference_lambdas(model), options.repeat)
+
+        def new_lambdas():
+            model.calculate_ngram_lambdas()
+            return model.lambdas
+
+        new_time, new = best_time(new_lambdas, options.repeat)
+        print("{:<10}{:>12}{:>16.3f}{:>12.3f}{:>10}".format(name, trie_size(model.root), ref_time,
+                                                            new_time, str(ref == new)))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nBye!", file=sys.stderr)
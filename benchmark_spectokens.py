@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8, vim: expandtab:ts=4 -*-
+###############################################################################
+# Copyright (c) 2015 Móréh, Tamás
+# All rights reserved. This program and the accompanying materials
+# are made available under the terms of the GNU Lesser Public License v3
+# which accompanies this distribution, and is available at
+# http://www.gnu.org/licenses/
+#
+# This file is part of PurePos-Python3.
+#
+# PurePos-Python3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PurePos-Python3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser Public License for more details.
+#
+# Contributors:
+#     Móréh, Tamás - initial API and implementation
+##############################################################################
+
+__author__ = 'morta@digitus.itk.ppke.hu'
+
+import argparse
+import sys
+import time
+from purepos.common.spectokenmatcher import SpecTokenMatcher
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Measure the special token matching on the "
+                                                 "tokens of a text, with the combined regular "
+                                                 "expression and with the ordered pattern list, "
+                                                 "and check that they give the same classes.")
+    parser.add_argument("-i", "--input-file", help="Raw (tokenized) or annotated (word#lemma#tag) "
+                                                   "text.", metavar="<file>", required=True)
+    parser.add_argument("-c", "--encoding", help="Encoding of the text. The default is utf-8.",
+                        metavar="<encoding>", default="utf-8")
+    parser.add_argument("-S", "--separator", help="Separator character between word, lemma and "
+                                                  "tags in annotated input. Default: '#'",
+                        metavar="<separator>", default="#")
+    parser.add_argument("-r", "--repeat", help="Number of measurements, the best is printed. "
+                                               "The default is 3.",
+                        metavar="<number>", type=int, default=3)
+    return parser.parse_args()
+
+
+def best_time(function, tokens: list, repeat: int) -> tuple:
+    best = None
+    ret = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ret = [function(token) for token in tokens]
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, ret
+
+
+def main():
+    options = parse_arguments()
+    with open(options.input_file, encoding=options.encoding) as source:
+        tokens = [token.split(options.separator)[0] for line in source for token in line.split()]
+    ordered_time, ordered = best_time(SpecTokenMatcher.match_lexical_element_ordered, tokens,
+                                      options.repeat)
+    combined_time, combined = best_time(SpecTokenMatcher.match_lexical_element, tokens,
+                                        options.repeat)
+    special = sum(cls is not None for cls in ordered)
+    mismatches = sum(a != b for a, b in zip(ordered, combined))
+    print("{} tokens, {} special, {} mismatches".format(len(tokens), special, mismatches))
+    print("{:<12}{:>10}{:>14}".format("matcher", "time (s)", "tokens/s"))
+    for name, elapsed in (("ordered", ordered_time), ("combined", combined_time)):
+        print("{:<12}{:>10.3f}{:>14.0f}".format(name, elapsed, len(tokens) / elapsed))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nBye!", file=sys.stderr)
@@ -25,7 +25,10 @@
 
 __author__ = 'morta@digitus.itk.ppke.hu'
 
+import io
 import os
+import shutil
+import tempfile
 from corpusreader.tokenreaders import BaseReader
 from corpusreader.tokenreaders import SentenceReader
 from docmodel.containers import Paragraph, Document
@@ -47,3 +50,100 @@ class CorpusReader(BaseReader):
         document = Document()
         document.append(paragraph)
         return document
+
+    def record_separator(self) -> str:
+        # A mondatok közötti elválasztó (ld. StreamedDocument.split).
+        return self.linesep
+
+    def read_sentences(self, file: io.TextIOWrapper):
+        # Mondatonként (soronként) olvas, nem tartja a korpuszt a memóriában.
+        for line in self.read_records(file, self.linesep):
+            if len(line) > 0:
+                yield self.sentence_parser.read(line)
+
+
+class FileRange(io.RawIOBase):
+    # Egy fájl [start, end) bájttartománya. os.pread-del olvas, így nem mozdítja a fájlleíró
+    # pozícióját, és forkolt folyamatokból is használható ugyanaz a leíró.
+    def __init__(self, fd: int, start: int, end: int):
+        super().__init__()
+        self.fd = fd
+        self.pos = start
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        size = min(len(b), self.end - self.pos)
+        if size <= 0:
+            return 0
+        data = os.pread(self.fd, size, self.pos)
+        b[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+
+class StreamedDocument:
+    """Document-like view of an analysed corpus for training: each sentences() call parses the
+    source again sentence by sentence, so the memory use does not depend on the size of the
+    corpus. A source which can not be seeked (eg. a pipe) is first copied to a temporary file.
+    """
+    SPLIT_BUFFER_SIZE = 1 << 16
+
+    def __init__(self, source: io.TextIOWrapper, reader: BaseReader):
+        self.reader = reader
+        if source.seekable():
+            self.source = source
+        else:
+            self.source = tempfile.TemporaryFile("w+", encoding="utf-8", newline="")
+            shutil.copyfileobj(source, self.source)
+            self.source.seek(0)
+        self.start = self.source.tell()
+
+    def sentences(self):
+        self.source.seek(self.start)
+        return self.reader.read_sentences(self.source)
+
+    def split(self, n: int) -> list:
+        """Split the corpus into at most n consecutive byte ranges of about the same size,
+        which start at sentence boundaries. Their range_sentences() together give the same
+        sentences, in the same order, as sentences(). If the source can not be split (eg. its
+        encoding is not ASCII compatible), the whole corpus is one range.
+        :param n: The maximum number of ranges.
+        :return: List of (start, end) byte offsets.
+        """
+        sep = self.reader.record_separator()
+        if not hasattr(os, "pread") or sep.encode(self.source.encoding) != sep.encode("ascii"):
+            return [(self.start, None)]
+        fd = self.source.fileno()
+        size = os.fstat(fd).st_size
+        if self.start > size:  # Nem bájtpozíció (a dekóder állapota is benne van).
+            return [(self.start, None)]
+        sep = sep.encode("ascii")
+        bounds = [self.start]
+        for i in range(1, n):
+            bound = self.find_separator(fd, self.start + (size - self.start) * i // n, sep, size)
+            if bounds[-1] < bound < size:
+                bounds.append(bound)
+        bounds.append(size)
+        return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+    def find_separator(self, fd: int, pos: int, sep: bytes, size: int) -> int:
+        # Az első pos utáni elválasztó vége (vagy a fájl vége).
+        while pos < size:
+            buf = os.pread(fd, self.SPLIT_BUFFER_SIZE + len(sep) - 1, pos)
+            i = buf.find(sep)
+            if i >= 0:
+                return pos + i + len(sep)
+            pos += self.SPLIT_BUFFER_SIZE
+        return size
+
+    def range_sentences(self, start: int, end: int or None):
+        # Egy split által adott tartomány mondatai. A forráson nem mozdít (ld. FileRange).
+        if end is None:
+            yield from self.sentences()
+            return
+        with io.TextIOWrapper(io.BufferedReader(FileRange(self.source.fileno(), start, end)),
+                              encoding=self.source.encoding) as file:
+            yield from self.reader.read_sentences(file)
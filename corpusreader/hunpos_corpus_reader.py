@@ -25,6 +25,7 @@
 
 __author__ = 'morta@digitus.itk.ppke.hu'
 
+import io
 from corpusreader.tokenreaders import BaseReader
 from corpusreader.tokenreaders import SentenceReader
 from corpusreader.tokenreaders import TaggedTokenReader
@@ -48,3 +49,12 @@ class HunPosCorpusReader(BaseReader):
         document = Document()
         document.append(paragraph)
         return document
+
+    def record_separator(self) -> str:
+        return self.linesep + self.linesep
+
+    def read_sentences(self, file: io.TextIOWrapper):
+        # Mondatonként olvas (ld. CorpusReader.read_sentences).
+        for sent in self.read_records(file, self.linesep + self.linesep):
+            if len(sent)-1 > 0:
+                yield self.sentence_parser.read(sent)
@@ -46,10 +46,24 @@ class BaseReader:
         pass
 
     def read_from_io(self, file: io.TextIOWrapper):
-        # todo: Biztos jó ötlet az egész fájlt beolvasni? Esetleg yield? NEM.
+        # Az egész fájlt beolvassa. Nagy korpuszokhoz ld. read_records.
         return self.read(file.read())
     # todo: line separator
 
+    @staticmethod
+    def read_records(file: io.TextIOWrapper, sep: str, chunk_size: int=1 << 20):
+        # A fájl sep-pel elválasztott részei (mint a file.read().split(sep)), de darabonként
+        # olvasva: egyszerre csak egy chunk és egy rész van a memóriában.
+        rest = ""
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            parts = (rest + chunk).split(sep)
+            rest = parts.pop()
+            yield from parts
+        yield rest
+
 
 class SimpleTokenReader(BaseReader):
     def read(self, text: str):
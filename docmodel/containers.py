@@ -41,6 +41,10 @@ class Sentence(list):
     def __str__(self):
         return SENTENCE_SEP.join([str(x) for x in self])
 
+    def to_string(self, sep: str, colors) -> str:
+        # A tokenek a megadott elválasztóval és színekkel.
+        return SENTENCE_SEP.join([x.to_string(sep, colors) for x in self])
+
 
 class Paragraph(list):
     """Represents a parapraph of tagged, stemmed sentences."""
@@ -27,12 +27,31 @@ __author__ = 'morta@digitus.itk.ppke.hu'
 
 
 class Colors:
+    # Az osztályszintű értékek az alapértelmezések (színtelen), a példányok felülírhatják.
     SEPARATOR = ""
     WORD = ""
     LEMMA = ""
     TAGS = ""
     ENDC = ""
 
+    @staticmethod
+    def terminal():
+        # HEADER = '\033[95m'
+        # OKBLUE = '\033[94m'
+        # OKGREEN = '\033[92m'
+        # WARNING = '\033[93m'
+        # FAIL = '\033[91m'
+        # ENDC = '\033[0m'
+        # BOLD = '\033[1m'
+        # UNDERLINE = '\033[4m'  # todo legyen témázható.
+        colors = Colors()
+        colors.ENDC = '\033[0m'
+        colors.WORD = '\033[93m'
+        colors.LEMMA = '\033[91m'
+        colors.TAGS = '\033[32m'  # '\033[36m'
+        colors.SEPARATOR = '\033[90m'
+        return colors
+
 
 class Token:
     """Class representing a stemmed tagged token in a sentence."""
@@ -46,12 +65,15 @@ class Token:
         self.hash_code = hash(self.stem) * 100 + hash(self.tag) * 10 + hash(self.token)
 
     def __str__(self):
+        return self.to_string(self.SEP, Colors)
+
+    def to_string(self, sep: str, colors: Colors) -> str:
         if self.tag is not None and self.stem is None:
-            return Colors.WORD + self.token + Colors.SEPARATOR + self.SEP + \
-                Colors.TAGS + self.tag + Colors.ENDC
+            return colors.WORD + self.token + colors.SEPARATOR + sep + \
+                colors.TAGS + self.tag + colors.ENDC
         else:
-            return Colors.WORD + self.token + Colors.SEPARATOR + self.SEP + Colors.LEMMA + \
-                self.stem + Colors.SEPARATOR + self.SEP + Colors.TAGS + self.tag + Colors.ENDC
+            return colors.WORD + self.token + colors.SEPARATOR + sep + colors.LEMMA + \
+                self.stem + colors.SEPARATOR + sep + colors.TAGS + self.tag + colors.ENDC
 
     def __hash__(self):
         return self.hash_code
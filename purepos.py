@@ -26,20 +26,23 @@
 __author__ = 'morta@digitus.itk.ppke.hu'
 
 import argparse
+import copy
 import os
 import sys
 import math
 import importlib.machinery
 from corpusreader.corpus_reader import CorpusReader
 from corpusreader.tokenreaders import StemmedTaggedTokenReader
-from docmodel.token import Token, Colors
+from docmodel.token import Colors
 from purepos.trainer import Trainer
 from purepos.common.serializer import StandardSerializer
-from purepos.common import util
+from purepos.common.util import Context
 from purepos.tagger import POSTagger, MorphTagger
-from purepos.morphology import BaseMorphologicalAnalyser, MorphologicalTable, HumorAnalyser
+from purepos.morphology import BaseMorphologicalAnalyser, MorphologicalTable, HumorAnalyser, \
+    CachingAnalyser
 from purepos.cli.configuration import Configuration
-from purepos.common.analysisqueue import AnalysisQueue
+from purepos.decoder import vectorizeddecoder
+from purepos.server import RequestBatcher, TaggingServer, UnixTaggingServer
 
 
 def parse_arguments():
@@ -47,11 +50,20 @@ def parse_arguments():
                                                             "morphological tagger.")
     # parser.add_argument("-h", "--help", help="Print this message.")
     parser.add_argument("command", help="Mode selection: train for training the "
-                                        "tagger, tag for tagging a text with the given model.",
-                        metavar="tag|train", type=str, choices=["tag", "train"])
+                                        "tagger, tag for tagging a text with the given model, "
+                                        "serve for tagging the requests of a socket server with "
+                                        "the given model, merge for combining models trained on "
+                                        "different corpora into one.",
+                        metavar="tag|train|serve|merge", type=str,
+                        choices=["tag", "train", "serve", "merge"])
+    parser.add_argument("models",
+                        help="The trained models to merge. The tag and emission orders must be "
+                             "the same. Merging only option.",
+                        metavar="<modelfile>", type=str, nargs="*")
     parser.add_argument("-m", "--model",
                         help="Specifies a path to a model file. If an exisiting model is given for "
-                             "training, the tool performs incremental training.",
+                             "training, the tool performs incremental training. With merge, the "
+                             "merged model is written here.",
                         metavar="<modelfile>", required=True, type=str)
     parser.add_argument("-t", "--tag-order",
                         help="Order of tag transition. Second order means "
@@ -74,6 +86,11 @@ def parse_arguments():
                              "'none', 'integrated' or a file : <morphologicalTableFile>. The "
                              "default is to use the integrated one. Tagging only option. ",
                         metavar="<analyzer>", type=str, default="integrated", dest="morphology")
+    parser.add_argument("--analyzer-cache",
+                        help="Cache the analyses of this many word forms (LRU) in front of the "
+                             "morphological analyzer, and report the hit rate and the time spent "
+                             "in the analyzer. The default is 0 (no cache). Tagging only option.",
+                        metavar="<number>", type=int, default=0, dest="analyser_cache")
     parser.add_argument("-H", "--pyhumor-path",
                         help="Set the path of the PyHumor module where the Humor class is defined.",
                         metavar="<path>", type=str, default="pyhumor/")
@@ -96,6 +113,12 @@ def parse_arguments():
                         help="Set the beam-search limit. "
                              "The default is 1000. Tagging only option.",
                         metavar="<theta>", type=int, default=1000)
+    parser.add_argument("-w", "--beam-width",
+                        help="Keep at most this many states in the Viterbi beam at each position, "
+                             "on top of the beam-search limit. This bounds the cost of each token. "
+                             "The default is no limit (10 with --beam-decoder). "
+                             "Tagging only option.",
+                        metavar="<number>", type=int, default=None)
     parser.add_argument("-o", "--output-file",
                         help="File where the tagging output is redirected. Tagging only option.",
                         metavar="<file>", type=str, default=None)
@@ -120,12 +143,58 @@ def parse_arguments():
     parser.add_argument("-d", "--beam-decoder",
                         help="Use Beam Search decoder. The default is to employ the Viterbi "
                              "algorithm. Tagging only option.", action="store_true")
-    # todo beam_size
+    parser.add_argument("--vectorized-decoder",
+                        help="Use the NumPy-vectorized Viterbi engine. It gives the same results "
+                             "as the default one. Tagging only option.", action="store_true")
+    parser.add_argument("--batch-size",
+                        help="Decode this many sentences together. The vectorized decoder "
+                             "advances the sentences of the same length in lockstep. With serve, "
+                             "the maximum number of sentences of concurrent requests tagged "
+                             "together. The default is 1 (32 for serve). Tagging only option.",
+                        metavar="<number>", type=int, default=None)
+    parser.add_argument("--transition-table",
+                        help="Precompute the tag transition log-probabilities into a dense or "
+                             "sparse-row table at compile time. It gives the same results as the "
+                             "default trie lookup. Tagging only option.",
+                        metavar="dense|sparse", type=str, choices=["dense", "sparse"],
+                        default=None)
+    parser.add_argument("--precompute-guessers",
+                        help="Store the smoothed tag distribution of every known suffix in the "
+                             "suffix guessers at compile time, so guessing unknown words needs no "
+                             "arithmetic. Tagging only option.", action="store_true")
+    parser.add_argument("-j", "--jobs",
+                        help="Tag with this many worker processes. The model is loaded once and "
+                             "shared by the workers, the output keeps the input order. With "
+                             "train, the corpus is split into this many parts, counted in "
+                             "parallel and merged. The default is 1.",
+                        metavar="<number>", type=int, default=1)
+    parser.add_argument("--host",
+                        help="The address the server listens on. The default is 127.0.0.1. "
+                             "Serving only option.",
+                        metavar="<address>", type=str, default="127.0.0.1")
+    parser.add_argument("-p", "--port",
+                        help="The TCP port the server listens on. The default is 8090. "
+                             "Serving only option.",
+                        metavar="<port>", type=int, default=8090)
+    parser.add_argument("--socket",
+                        help="Listen on this Unix domain socket instead of TCP. "
+                             "Serving only option.",
+                        metavar="<path>", type=str, default=None, dest="socket_path")
+    parser.add_argument("--batch-delay",
+                        help="The maximum time in milliseconds the server waits for concurrent "
+                             "requests to fill a batch. The default is 5. Serving only option.",
+                        metavar="<ms>", type=float, default=5.0)
     parser.add_argument("-f", "--config-file",
                         help="Configuratoin file containg tag mappings. "
                              "Defaults to do not map any tag.",
                         metavar="<file>", type=str, default=None)
-    return parser.parse_args()
+    # A merge modelljei az opciók után is állhatnak.
+    options = parser.parse_intermixed_args()
+    if options.command == "merge" and len(options.models) == 0:
+        parser.error("merge requires at least one model file to merge")
+    if options.command != "merge" and len(options.models) > 0:
+        parser.error("unrecognized arguments: {}".format(" ".join(options.models)))
+    return options
 
 
 class PurePos:
@@ -139,6 +208,8 @@ class PurePos:
     """
     TAG_OPT = "tag"
     TRAIN_OPT = "train"
+    SERVE_OPT = "serve"
+    MERGE_OPT = "merge"
     PRE_MA = "pre"
     NONE_MA = "none"
     INTEGRATED_MA = "integrated"
@@ -152,7 +223,8 @@ class PurePos:
               suff_length: int,
               rare_freq: int,
               separator: str,
-              linesep: str):  # todo verbose mode
+              linesep: str,
+              jobs: int=1):  # todo verbose mode
         """Create a language model from an analysed corpora (and optionally from an existing model).
         It performs on the given input which can be also the stdin.
 
@@ -165,12 +237,14 @@ class PurePos:
         :param rare_freq:  # todo
         :param separator: The sepatator character(s) inside the token. Default/traditionally: '#'.
         :param linesep: The sepatator character(s) between the sentences. Default: newline.
+        :param jobs: The number of worker processes counting the shards of the corpus.
         """
         if input_path is not None:
             source = open(input_path, encoding=encoding)  # todo default encoding? (a Python3 okos)
         else:
             source = sys.stdin
-        trainer = Trainer(source, CorpusReader(StemmedTaggedTokenReader(separator, linesep)))
+        trainer = Trainer(source, CorpusReader(StemmedTaggedTokenReader(separator, linesep)),
+                          jobs)
 
         if os.path.isfile(model_path):
             print("Reading model... ", file=sys.stderr)
@@ -185,6 +259,28 @@ class PurePos:
         StandardSerializer.write_model(ret_model, model_path)
         print("Done!", file=sys.stderr)
 
+    @staticmethod
+    def merge(model_path: str, input_paths: list):
+        """Combine models trained on different corpora (eg. the shards of a corpus trained on
+        different machines) into one, as if it was trained on their concatenation. The combiner
+        parameters are the average of the models' weighted by their training corpus sizes.
+
+        :param model_path: Path of the merged model file.
+        :param input_paths: Paths of the models to merge. The suffix length and the rare frequency
+            of the first one are used.
+        """
+        if len(input_paths) == 0:
+            raise ValueError("No models to merge.")
+        print("Reading models... ", file=sys.stderr)
+        models = [StandardSerializer.read_model(path) for path in input_paths]
+        print("Merging models... ", file=sys.stderr)
+        ret_model = models[0]
+        ret_model.merge_trained(models[1:])
+        print(ret_model.last_stat().stat(ret_model), file=sys.stderr)
+        print("Writing model... ", file=sys.stderr)
+        StandardSerializer.write_model(ret_model, model_path)
+        print("Done!", file=sys.stderr)
+
     @staticmethod
     def tag(encoding: str,
             model_path: str,
@@ -198,7 +294,15 @@ class PurePos:
             out_path: str,
             use_colored_stdout: bool,
             humor_path: str,
-            lex_path: str):  # todo IDÁIG KIHOZNI A HUMOR KONSTRUKTOR ELEMEIT *args, **kwargs
+            lex_path: str,
+            use_vectorized: bool=False,
+            batch_size: int=1,
+            transition_table: str=None,
+            precompute_guessers: bool=False,
+            beam_width: int=None,
+            jobs: int=1,
+            context: Context=None,
+            analyser_cache: int=0):  # todo IDÁIG KIHOZNI A HUMOR KONSTRUKTOR ELEMEIT *args, **kwargs
         """Perform tagging on the given input with the given model an properties to the given
         output. The in and output can be also the standard IO.
 
@@ -216,35 +320,101 @@ class PurePos:
         :param use_colored_stdout: Use colored output only if the output is the stdout.
         :param humor_path: The path of the pyhumor module file.
         :param lex_path: The path of the lex directory for humor.
+        :param use_vectorized: Using the NumPy-vectorized Viterbi engine.
+        :param batch_size: The number of sentences decoded together.
+        :param transition_table: "dense" or "sparse" to precompute the tag transition
+            log-probabilities. If None, they are looked up in the trie.
+        :param precompute_guessers: Precompute the smoothed suffix distributions of the guessers.
+        :param beam_width: The maximum number of states in the Viterbi beam. If None, only the
+            beam_theta limit is used.
+        :param jobs: The number of worker processes used for tagging.
+        :param context: The configuration, separators and colors of the tagger. If None, the
+            defaults are used.
+        :param analyser_cache: The number of word forms whose analyses are cached. If 0, the
+            analyser is not cached.
         """
+        if context is None:
+            context = Context()
         if not input_path:
             source = sys.stdin
             if use_colored_stdout:
-                # HEADER = '\033[95m'
-                # OKBLUE = '\033[94m'
-                # OKGREEN = '\033[92m'
-                # WARNING = '\033[93m'
-                # FAIL = '\033[91m'
-                # ENDC = '\033[0m'
-                # BOLD = '\033[1m'
-                # UNDERLINE = '\033[4m'  # todo legyen témázható.
-                Colors.ENDC = '\033[0m'
-                Colors.WORD = '\033[93m'
-                Colors.LEMMA = '\033[91m'
-                Colors.TAGS = '\033[32m'  # '\033[36m'
-                Colors.SEPARATOR = '\033[90m'
+                context = copy.copy(context)
+                context.colors = Colors.terminal()
         else:
             source = open(input_path, encoding=encoding)  # todo default encoding? (a Python3 okos)
 
-        tagger = PurePos.create_tagger(model_path, analyser, no_stemming, max_guessed,
-                                       math.log(beam_theta), use_beam_search, util.CONFIGURATION,
-                                       humor_path, lex_path)
+        ma = PurePos.create_analyser(analyser, humor_path, lex_path, analyser_cache)
+        tagger = PurePos.create_tagger(model_path, ma, no_stemming, max_guessed,
+                                       math.log(beam_theta), use_beam_search,
+                                       context.configuration, humor_path, lex_path,
+                                       use_vectorized, transition_table, precompute_guessers,
+                                       beam_width, context)
         if not out_path:
             output = sys.stdout
         else:
             output = open(out_path, mode="w", encoding=encoding)
         print("Tagging:", file=sys.stderr)
-        tagger.tag(source, output, max_resnum)
+        tagger.tag(source, output, max_resnum, batch_size, jobs)
+        if isinstance(ma, CachingAnalyser):
+            print(ma.stat(), file=sys.stderr)
+
+    @staticmethod
+    def serve(encoding: str,
+              model_path: str,
+              analyser: str,
+              no_stemming: bool,
+              max_guessed: int,
+              max_resnum: int,
+              beam_theta: int,
+              use_beam_search: bool,
+              humor_path: str,
+              lex_path: str,
+              use_vectorized: bool=False,
+              transition_table: str=None,
+              precompute_guessers: bool=False,
+              beam_width: int=None,
+              host: str="127.0.0.1",
+              port: int=8090,
+              socket_path: str=None,
+              batch_size: int=RequestBatcher.DEFAULT_MAX_BATCH,
+              batch_delay: float=RequestBatcher.DEFAULT_MAX_DELAY,
+              context: Context=None,
+              analyser_cache: int=0):
+        """Load and compile the model once and tag the requests of a TCP or Unix socket server
+        with it, until interrupted. Every request line is a sentence (or a JSON object), see
+        purepos.server. The sentences of concurrent requests are tagged in small batches.
+
+        The tagging parameters are the same as in tag().
+        :param host: The address of the TCP server.
+        :param port: The port of the TCP server.
+        :param socket_path: Path of a Unix domain socket. If given, it is used instead of TCP.
+        :param batch_size: The maximum number of sentences tagged together.
+        :param batch_delay: The maximum time in seconds to wait for requests to fill a batch.
+        :param context: The configuration, separators and colors of the tagger.
+        :param analyser_cache: The number of word forms whose analyses are cached.
+        """
+        if context is None:
+            context = Context()
+        ma = PurePos.create_analyser(analyser, humor_path, lex_path, analyser_cache)
+        tagger = PurePos.create_tagger(model_path, ma, no_stemming, max_guessed,
+                                       math.log(beam_theta), use_beam_search,
+                                       context.configuration, humor_path, lex_path,
+                                       use_vectorized, transition_table, precompute_guessers,
+                                       beam_width, context)
+        if socket_path is not None:
+            server = UnixTaggingServer(socket_path, tagger, max_resnum, batch_size, batch_delay,
+                                       encoding)
+            print("Serving on {}".format(socket_path), file=sys.stderr)
+        else:
+            server = TaggingServer((host, port), tagger, max_resnum, batch_size, batch_delay,
+                                   encoding)
+            print("Serving on {}:{}".format(host, port), file=sys.stderr)
+        with server:
+            try:
+                server.serve_forever()
+            finally:
+                if isinstance(ma, CachingAnalyser):
+                    print(ma.stat(), file=sys.stderr)
 
     @staticmethod
     def load_humor(humor_path: str, lex_path: str) -> HumorAnalyser:
@@ -259,20 +429,52 @@ class PurePos:
         humor = humor_module.Humor(_lex_path=lex_path)
         return HumorAnalyser(humor)
 
+    @staticmethod
+    def create_analyser(analyser: str, humor_path: str, lex_path: str,
+                        cache_size: int=0) -> BaseMorphologicalAnalyser:
+        """Create the morphological analyser.
+
+        :param analyser: "integrated", "none" or the path of a morphological table.
+        :param humor_path: The path of the pyhumor module.
+        :param lex_path: The path of the lex directory for humor.
+        :param cache_size: If positive, the analyser is wrapped in a CachingAnalyser of this size.
+        :return: The analyser object.
+        """
+        if analyser == PurePos.INTEGRATED_MA:
+            try:
+                ma = PurePos.load_humor(humor_path+"/bin/pyhumor/__init__.py", lex_path)
+            except FileNotFoundError:
+                print("Humor module not found. Not using any morphological analyzer.",
+                      file=sys.stderr)
+                ma = BaseMorphologicalAnalyser()
+        elif analyser == PurePos.NONE_MA:
+            ma = BaseMorphologicalAnalyser()
+        else:
+            print("Using morphological table at: {}.".format(analyser), file=sys.stderr)
+            ma = MorphologicalTable(open(analyser))
+        if cache_size > 0:
+            ma = CachingAnalyser(ma, cache_size)
+        return ma
+
     @staticmethod
     def create_tagger(model_path: str,
-                      analyser: str,
+                      analyser: str or BaseMorphologicalAnalyser,
                       no_stemming: bool,
                       max_guessed: int,
                       beam_log_theta: float,
                       use_beam_search: bool,
                       conf: Configuration,
                       humor_path: str,
-                      lex_path: str) -> POSTagger:
+                      lex_path: str,
+                      use_vectorized: bool=False,
+                      transition_table: str=None,
+                      precompute_guessers: bool=False,
+                      beam_width: int=None,
+                      context: Context=None) -> POSTagger:
         """Create a tagger object with the given properties.
 
         :param model_path:
-        :param analyser:
+        :param analyser: An analyser object, or its name for create_analyser.
         :param no_stemming:
         :param max_guessed:
         :param beam_log_theta:
@@ -280,47 +482,49 @@ class PurePos:
         :param conf:
         :param humor_path:
         :param lex_path:
+        :param use_vectorized:
+        :param transition_table:
+        :param precompute_guessers:
+        :param beam_width:
+        :param context: Per-tagger settings. If None, one is made with conf.
         :return: a tagger object.
         """
-        if analyser == PurePos.INTEGRATED_MA:
-            try:
-                ma = PurePos.load_humor(humor_path+"/bin/pyhumor/__init__.py", lex_path)
-            except FileNotFoundError:
-                print("Humor module not found. Not using any morphological analyzer.",
-                      file=sys.stderr)
-                ma = BaseMorphologicalAnalyser()
-        elif analyser == PurePos.NONE_MA:
-            ma = BaseMorphologicalAnalyser()
+        if isinstance(analyser, BaseMorphologicalAnalyser):
+            ma = analyser
         else:
-            print("Using morphological table at: {}.".format(analyser), file=sys.stderr)
-            ma = MorphologicalTable(open(analyser))
+            ma = PurePos.create_analyser(analyser, humor_path, lex_path)
         print("Reading model... ", file=sys.stderr)
         rawmodel = StandardSerializer.read_model(model_path)
         print("Compiling model... ", file=sys.stderr)
-        cmodel = rawmodel.compile(conf)
+        cmodel = rawmodel.compile(conf, transition_table, precompute_guessers)
         suff_log_theta = math.log(10)
+        if use_vectorized and vectorizeddecoder.numpy is None:
+            print("NumPy not found. Using the default Viterbi decoder.", file=sys.stderr)
+            use_vectorized = False
+        if context is None:
+            context = Context(conf)
         if no_stemming:
             tagger = POSTagger(cmodel, ma, beam_log_theta,
-                               suff_log_theta, max_guessed, use_beam_search)
+                               suff_log_theta, max_guessed, use_beam_search, use_vectorized,
+                               beam_width, context)
         else:
             tagger = MorphTagger(cmodel, ma, beam_log_theta, suff_log_theta,
-                                 max_guessed, use_beam_search)
+                                 max_guessed, use_beam_search, use_vectorized, beam_width,
+                                 context)
         return tagger
 
     def __init__(self, options: dict):
         self.options = options
         seps = options["input_separator"][1:].split(options["input_separator"][0])
-        AnalysisQueue.ANAL_OPEN = seps[0]
-        AnalysisQueue.ANAL_SPLIT_RE = seps[1]
-        AnalysisQueue.ANAL_CLOSE = seps[2]
-        AnalysisQueue.ANAL_TAG_OPEN = seps[3]
+        # Az elemzések elválasztói: (nyitó, elválasztó, záró, tag nyitó).
+        self.anal_separators = (seps[0], seps[1], seps[2], seps[3])
 
     def run(self):
         if self.options.get("config_file") is None:
-            util.CONFIGURATION = Configuration()
+            conf = Configuration()
         else:
-            util.CONFIGURATION = Configuration.read(self.options["config_file"])
-        Token.SEP = self.options["separator"]
+            conf = Configuration.read(self.options["config_file"])
+        context = Context(conf, self.options["separator"], anal_separators=self.anal_separators)
         if self.options["command"] == self.TRAIN_OPT:
             self.train(self.options["encoding"],
                        self.options["model"],
@@ -330,7 +534,8 @@ class PurePos:
                        self.options["suffix_length"],
                        self.options["rare_frequency"],
                        self.options["separator"],
-                       "\n")  # todo sor elválasztó?
+                       "\n",  # todo sor elválasztó?
+                       self.options.get("jobs", 1))
         elif self.options["command"] == self.TAG_OPT:
             self.tag(self.options["encoding"],
                      self.options["model"],
@@ -344,7 +549,39 @@ class PurePos:
                      self.options["output_file"],
                      self.options.get("color_stdout", False),
                      self.options["pyhumor_path"],
-                     self.options["lex_path"])
+                     self.options["lex_path"],
+                     self.options.get("vectorized_decoder", False),
+                     self.options.get("batch_size") or 1,
+                     self.options.get("transition_table"),
+                     self.options.get("precompute_guessers", False),
+                     self.options.get("beam_width"),
+                     self.options.get("jobs", 1),
+                     context,
+                     self.options.get("analyser_cache", 0))
+        elif self.options["command"] == self.MERGE_OPT:
+            self.merge(self.options["model"], self.options["models"])
+        elif self.options["command"] == self.SERVE_OPT:
+            self.serve(self.options["encoding"],
+                       self.options["model"],
+                       self.options["morphology"],
+                       self.options.get("no_stemming", False),
+                       self.options["max_guessed"],
+                       self.options["max_results"],
+                       self.options["beam_theta"],
+                       self.options.get("beam_decoder", False),
+                       self.options["pyhumor_path"],
+                       self.options["lex_path"],
+                       self.options.get("vectorized_decoder", False),
+                       self.options.get("transition_table"),
+                       self.options.get("precompute_guessers", False),
+                       self.options.get("beam_width"),
+                       self.options.get("host", "127.0.0.1"),
+                       self.options.get("port", 8090),
+                       self.options.get("socket_path"),
+                       self.options.get("batch_size") or RequestBatcher.DEFAULT_MAX_BATCH,
+                       self.options.get("batch_delay", 5.0) / 1000,
+                       context,
+                       self.options.get("analyser_cache", 0))
 
 
 def main():
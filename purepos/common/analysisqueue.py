@@ -40,35 +40,36 @@ class AnalysisQueue:
     ANAL_TAG_OPEN = "["
     DOLLARS = "$$"
 
-    @staticmethod
-    def parse(token: str) -> tuple:
-        word_rb = token.find(AnalysisQueue.ANAL_OPEN)
-        anal_rb = token.find(AnalysisQueue.ANAL_CLOSE)
+    def __init__(self, anal_open: str=ANAL_OPEN, anal_split: str=ANAL_SPLIT_RE,
+                 anal_close: str=ANAL_CLOSE, anal_tag_open: str=ANAL_TAG_OPEN):
+        # Mondatonként (kérésenként) új példány kell, az elválasztók a taggeré (ld. util.Context).
+        self.anal_open = anal_open
+        self.anal_split = anal_split
+        self.anal_close = anal_close
+        self.anal_tag_open = anal_tag_open
+        self.anals = []
+        self.use_prob = []
+        self.words = []
+
+    def parse(self, token: str) -> tuple:
+        word_rb = token.find(self.anal_open)
+        anal_rb = token.find(self.anal_close)
         word = token[:word_rb]
-        anals_strs = token[word_rb+len(AnalysisQueue.ANAL_OPEN):anal_rb]
-        anals_list = anals_strs.split(AnalysisQueue.ANAL_SPLIT_RE)
+        anals_strs = token[word_rb+len(self.anal_open):anal_rb]
+        anals_list = anals_strs.split(self.anal_split)
         return word, anals_list
 
-    @staticmethod
-    def ispreanalysed(word: str) -> bool:
-        return word.find(AnalysisQueue.ANAL_OPEN) > 0 and word.rfind(AnalysisQueue.ANAL_CLOSE) > 0
+    def ispreanalysed(self, word: str) -> bool:
+        return word.find(self.anal_open) > 0 and word.rfind(self.anal_close) > 0
 
-    @staticmethod
-    def clean(word: str) -> str:
-        return word[:word.find(AnalysisQueue.ANAL_OPEN)]
+    def clean(self, word: str) -> str:
+        return word[:word.find(self.anal_open)]
 
-    @staticmethod
-    def anal2tag(anal: str) -> str:
-        return anal[anal.find(AnalysisQueue.ANAL_TAG_OPEN):]
+    def anal2tag(self, anal: str) -> str:
+        return anal[anal.find(self.anal_tag_open):]
 
-    @staticmethod
-    def anal2lemma(anal: str) -> str:
-        return anal[:anal.find(AnalysisQueue.ANAL_TAG_OPEN)]
-
-    def __init__(self):
-        self.anals = []
-        self.use_prob = []
-        self.words = []
+    def anal2lemma(self, anal: str) -> str:
+        return anal[:anal.find(self.anal_tag_open)]
 
     def init(self, capacity: int):
         # capacity méretűre allokáljuk a listákat a későbbi gyorsabb feltöltéshez.
@@ -109,7 +110,7 @@ class AnalysisQueue:
 
     def transform_tags(self, pos: int, tag_voc: BaseVocabulary) -> dict:
         mp = {}
-        for k, v in self.anals[pos]:
+        for k, v in self.anals[pos].items():
             tagstr = self.anal2tag(k)
             tag = tag_voc.index(tagstr)
             if tag is None:
@@ -25,6 +25,7 @@
 
 __author__ = 'morta@digitus.itk.ppke.hu'
 
+import copy
 from docmodel.token import Token
 from purepos.model.vocabulary import BaseVocabulary
 from purepos.model.modeldata import ModelData
@@ -110,6 +111,10 @@ class BaseLemmaTransformation:
     def decode(self, word: str, lemma: str, tag: int):
         pass
 
+    def remap_tag(self, tag_map: dict):
+        # Ugyanez a transzformáció a tag_map szerint átszámozott tag-gel (ld. RawModel.merge).
+        pass
+
     def encode(self, word: str, rep) -> tuple:
         pass
 
@@ -160,6 +165,14 @@ class GeneralizedLemmaTransformation(BaseLemmaTransformation):
     def min_cut_length(self) -> int:
         return self.representation.remove_end
 
+    def remap_tag(self, tag_map: dict):
+        ret = copy.copy(self)
+        rep = self.representation
+        ret.representation = GeneralizedLemmaTransformation.Transformation(
+            rep.remove_start, rep.remove_end, rep.add_start, rep.add_end, tag_map[rep.tag],
+            rep.to_lower)
+        return ret
+
     def decode(self, word: str, lemma: str, tag: int) -> Transformation:
         pos_word_lemma = longest_substring(word, lemma)
         pos_lemma_word = longest_substring(lemma, word)
@@ -211,3 +224,10 @@ class SuffixLemmaTransformation(BaseLemmaTransformation):
 
     def min_cut_length(self):
         return self.representation[1] % SuffixLemmaTransformation.SHIFT
+
+    def remap_tag(self, tag_map: dict):
+        ret = copy.copy(self)
+        tag, cut_size = divmod(self.representation[1], SuffixLemmaTransformation.SHIFT)
+        ret.representation = (self.representation[0],
+                              SuffixLemmaTransformation.SHIFT * tag_map[tag] + cut_size)
+        return ret
@@ -37,19 +37,39 @@ class SpecTokenMatcher:
     # jelek a Szeged Corpus konvenciói miatt itt NEM részei a @PUNCT halmaznak.
     # <megj.> A ` karakter egyszer fordul elő a Szeged általunk használt verziójában,
     # ott is véletlen szemét.</megj.>
+    punct_chars = u'!"#$%&()*+,-.:;<=>?@[\]^_`{|}~«»…·→—•\''
     cls_pat_list = [
         ("@CARD", re.compile("^[0-9]+$")),
         ("@CARDPUNCT", re.compile("^[0-9]+\.$")),
         ("@CARDSEPS", re.compile("^[0-9\.,:\-]+[0-9]+$")),
         ("@CARDSUFFIX", re.compile("^[0-9]+[a-zA-Z][a-zA-Z]?[a-zA-Z]?$")),
         ("@HTMLENTITY", re.compile("^&[^;]+;?$")),
-        ("@PUNCT", re.compile('^['+re.escape(u'!"#$%&()*+,-.:;<=>?@[\]^_`{|}~«»…·→—•\'')+']+$'),
+        ("@PUNCT", re.compile('^['+re.escape(punct_chars)+']+$'),
          re.U)
     ]
 
+    # Egymenetes változat: az összes minta egyetlen, sorrendtartó alternációban, névvel ellátott
+    # csoportokkal. A reguláris kifejezés a $ elbukásakor a következő alternatívára lép vissza,
+    # így pontosan a cls_pat_list első illeszkedő mintáját adja.
+    # Minden minta számmal, &-lel vagy írásjellel kezdődik: a betűvel kezdődő (tipikus) szavakat
+    # a regex futtatása nélkül eldobjuk.
+    first_chars = frozenset("0123456789&" + punct_chars)
+    combined_pat = re.compile("^(?:" + "|".join("(?P<{}>{})".format(name[1:],
+                                                                      pat.pattern[1:-1])
+                                                for name, pat, *_ in cls_pat_list) + ")$")
+
     @staticmethod
     def match_lexical_element(token: str):
         # Az első találatot adja vissza.
+        if not token or token[0] not in SpecTokenMatcher.first_chars:
+            return None
+        m = SpecTokenMatcher.combined_pat.match(token)
+        if m is not None:
+            return "@" + m.lastgroup
+
+    @staticmethod
+    def match_lexical_element_ordered(token: str):
+        # A minták egyenkénti kipróbálása (referencia a match_lexical_element-hez).
         for pair in SpecTokenMatcher.cls_pat_list:
             if pair[1].match(token):
                 return pair[0]
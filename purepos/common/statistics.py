@@ -50,6 +50,12 @@ class Statistics:
     def increment_sentence_count(self):
         self.sentences += 1
 
+    def merge(self, other):
+        self.sentences += other.sentences
+        self.tokens += other.tokens
+        self.l_guesser_items += other.l_guesser_items
+        self.u_guesser_items += other.u_guesser_items
+
     def stat(self, model):
         return \
             """Training corpus:
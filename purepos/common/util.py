@@ -28,18 +28,32 @@ __author__ = 'morta@digitus.itk.ppke.hu'
 import os
 from docmodel import token
 from purepos.common.analysisqueue import AnalysisQueue
+from purepos.cli.configuration import Configuration
 
 STEM_FILTER_FILE = "purepos_stems.txt"
 UNKOWN_VALUE = -99.0
-LEMMA_MAPPER = None  # StringMapper
-analysis_queue = AnalysisQueue()
-CONFIGURATION = None  # Nem teszteltük.
 
 
-class Constants:  # todo: ötlet minden konstans egy objektumba -> egy időben több különböző PurePOS
-    # todo: https://github.com/ppke-nlpg/purepos-python3/issues/7
-    def __init__(self):
-        pass
+class Context:
+    # A futásonkénti beállítások egy objektumban (korábban modul- és osztályszintű globálisok),
+    # így egy processzben több, eltérően konfigurált PurePOS is futhat, akár párhuzamosan is.
+    # https://github.com/ppke-nlpg/purepos-python3/issues/7
+    # A mondatonkénti állapot (AnalysisQueue) a new_analysis_queue()-val készül.
+    def __init__(self, configuration: Configuration=None,
+                 separator: str=token.Token.SEP,
+                 colors: token.Colors=None,
+                 anal_separators: tuple=None,  # (open, split, close, tag open)
+                 lemma_mapper=None):  # StringMapper
+        self.configuration = configuration if configuration is not None else Configuration()
+        self.separator = separator
+        self.colors = colors if colors is not None else token.Colors()
+        self.anal_separators = anal_separators if anal_separators is not None else \
+            (AnalysisQueue.ANAL_OPEN, AnalysisQueue.ANAL_SPLIT_RE, AnalysisQueue.ANAL_CLOSE,
+             AnalysisQueue.ANAL_TAG_OPEN)
+        self.lemma_mapper = lemma_mapper
+
+    def new_analysis_queue(self) -> AnalysisQueue:
+        return AnalysisQueue(*self.anal_separators)
 
 class StemFilter:
     def __init__(self, filename: str):
@@ -79,8 +93,8 @@ class StemFilter:
     # return max_k, max_v
 
 
-def simplify_lemma(t: token.Token):
-    if LEMMA_MAPPER is not None:
+def simplify_lemma(t: token.Token, lemma_mapper=None):
+    if lemma_mapper is not None:
         return token.ModToken(t.token, original_stem=t.stem,
-                              stem=LEMMA_MAPPER.map(t.stem), tag=t.tag)
+                              stem=lemma_mapper.map(t.stem), tag=t.tag)
     return t
@@ -25,13 +25,16 @@
 
 __author__ = 'morta@digitus.itk.ppke.hu'
 
+import functools
+import heapq
 import math
+from array import array
 from purepos.common.spectokenmatcher import SpecTokenMatcher
-from purepos.common import util
+from purepos.common.analysisqueue import AnalysisQueue
 from purepos.morphology import BaseMorphologicalAnalyser
 from purepos.model.rawmodel import CompiledModel
 from purepos.model.mapper import TagMapper
-from purepos.model.ngram import NGram
+from purepos.model.ngram import NGramPacker
 from purepos.model.modeldata import ModelData
 from purepos.model.probmodel import BaseProbabilityModel
 from purepos.model.suffixguesser import HashSuffixGuesser
@@ -48,17 +51,7 @@ UNKNOWN_TAG_WEIGHT = -99.0
 UNKOWN_TAG_TRANSITION = -99.0
 UNKNOWN_VALUE = -99.0
 TAB = "\t"  # ez eredetileg field volt.
-
-
-class Node:
-    def __init__(self, state: NGram, weight: float, previous: NGram or None):
-        self.state = state
-        self.weight = weight
-        self.prev = previous
-
-    def __str__(self):
-        return "{state: {}, weight: {}}".format(str(self.state), str(self.weight))
-
+DEFAULT_WORD_CACHE_SIZE = 65536
 
 
 class BaseDecoder:
@@ -66,41 +59,84 @@ class BaseDecoder:
                  morphological_analyzer: BaseMorphologicalAnalyser,
                  log_theta: float,
                  suf_theta: float,
-                 max_guessed_tags: int):
+                 max_guessed_tags: int,
+                 word_cache_size: int=DEFAULT_WORD_CACHE_SIZE):
         self.model = model
         self.morphological_analyzer = morphological_analyzer
         self.log_theta = log_theta
         self.suf_theta = suf_theta
         self.max_guessed_tags = max_guessed_tags
         self.tags = model.data.tag_vocabulary.tag_indices()
+        # A beam állapotai az utolsó tagging_order tag egy int-be tömörítve.
+        self.packer = NGramPacker(model.data.tagging_order)
+        # Szóalakonkénti osztályozás cache-e (ld. classify_word).
+        self.word_classes = functools.lru_cache(maxsize=word_cache_size)(self.classify_word)
 
-    def next_probs(self, prev_tags_set: set, word: str, position: int, is_first: bool) -> dict:
+    def next_probs(self, prev_tags_set: set, word: str, position: int, is_first: bool,
+                   user_anals: AnalysisQueue=None) -> dict:
         # A szóhoz tartozó tag-valószínűségeket gyűjti ki.
         # A token tulajdonságai határozzák meg a konkrét fv-t.
-        spectoken_matcher = SpecTokenMatcher()
+        # user_anals: a mondat felhasználó által megadott elemzései (ha vannak).
         if word == ModelData.EOS_TOKEN:
             return self.next_for_eos_token(prev_tags_set)
 
+        seen, word_prob_model, word_form, is_spec, tags, anals, isoov, lword, isupper = \
+            self.word_classes(word, is_first)
+        if any(type(tag) is str for tag in anals):
+            # A modell által nem ismert tag-ek a kérés overlay-ébe (ld. VocabularyOverlay).
+            anals = tuple(tag if type(tag) is int else
+                          self.model.data.tag_vocabulary.add_element(tag) for tag in anals)
+        if user_anals is not None and user_anals.has_anal(position):
+            new_tags = user_anals.tags(position, self.model.data.tag_vocabulary)
+            if user_anals.use_probabilities(position):
+                new_word_model = user_anals.lexical_model_for_word(position,
+                                                                   self.model.data.tag_vocabulary)
+                return self.next_for_seen_token(prev_tags_set, new_word_model, word_form,
+                                                is_spec, new_tags, anals)
+            else:
+                if seen != UNSEEN:
+                    return self.next_for_seen_token(prev_tags_set, word_prob_model, word_form,
+                                                    is_spec, new_tags, anals)
+                else:
+                    if len(new_tags) == 1:
+                        return self.next_for_single_tagged_token(prev_tags_set, new_tags)
+                    else:
+                        return self.next_for_guessed_token(prev_tags_set, lword, isupper,
+                                                           new_tags, False)
+        else:
+            if seen != UNSEEN:
+                return self.next_for_seen_token(prev_tags_set, word_prob_model, word_form,
+                                                is_spec, tags, anals)
+            else:
+                if len(anals) == 1:
+                    return self.next_for_single_tagged_token(prev_tags_set, anals)
+                else:
+                    return self.next_for_guessed_token(prev_tags_set, lword, isupper, anals, isoov)
+
+    def classify_word(self, word: str, is_first: bool) -> tuple:
+        # A szó osztályozása (ismert / kisbetűsítve ismert / speciális / ismeretlen), a hozzá
+        # tartozó emissziós modell, szóalak és tag-halmaz. Csak a szóalaktól és az is_first-től
+        # függ, ezért a word_classes LRU cache-ben mondatokon át újrahasznosítható.
+        # Az eredményt nem szabad módosítani! A modell által nem ismert tag-ek stringként maradnak
+        # az elemzések között, az indexük kérésenként más lehet.
         lword = word.lower()
         isupper = not (lword == word)
         anals = []
         isoov = True
-        # seen = NOT_SPECIFIED
         word_prob_model = BaseProbabilityModel()
         word_form = word
-        # tags = set()
         is_spec = False
-        # spec_name = ""
 
         str_anals = self.morphological_analyzer.tags(word)
         if len(str_anals) > 0:
             isoov = False
+            vocab = self.model.data.tag_vocabulary
             for tag in str_anals:
-                i = self.model.data.tag_vocabulary.index(tag)
-                if i is not None:
+                i = vocab.index(tag)
+                if i is not None and i <= vocab.max_index():
                     anals.append(i)
                 else:
-                    anals.append(self.model.data.tag_vocabulary.add_element(tag))
+                    anals.append(tag)
 
         tags = self.model.data.standard_tokens_lexicon.tags(word)
         if len(tags) > 0:
@@ -114,7 +150,7 @@ class BaseDecoder:
                 word_form = lword
                 seen = LOWER_CASED_SEEN
             else:
-                spec_name = spectoken_matcher.match_lexical_element(word)
+                spec_name = SpecTokenMatcher.match_lexical_element(word)
                 is_spec = (spec_name is not None)
                 if is_spec:
                     word_prob_model = self.model.compiled_data.spec_tokens_emission_model
@@ -126,39 +162,17 @@ class BaseDecoder:
                     word_form = spec_name
                 else:
                     seen = UNSEEN
-        user_anals = util.analysis_queue
-        if user_anals.has_anal(position):
-            new_tags = user_anals.tags(position, self.model.data.tag_vocabulary)
-            if user_anals.use_probabilities(position):
-                new_word_model = user_anals.lexical_model_for_word(position,
-                                                                   self.model.data.tag_vocabulary)
-                return self.next_for_seen_token(prev_tags_set, new_word_model, word_form,
-                                                is_spec, new_tags, anals)
-            else:
-                if seen != UNSEEN:
-                    return self.next_for_seen_token(prev_tags_set, word_prob_model, word_form,
-                                                    is_spec, new_tags, anals)
-                else:
-                    if len(new_tags) == 1:
-                        return self.next_for_single_tagged_token(prev_tags_set, new_tags)
-                    else:
-                        return self.next_for_guessed_token(prev_tags_set, lword, isupper,
-                                                           new_tags, False)
-        else:
-            if seen != UNSEEN:
-                return self.next_for_seen_token(prev_tags_set, word_prob_model, word_form,
-                                                is_spec, tags, anals)
-            else:
-                if len(anals) == 1:
-                    return self.next_for_single_tagged_token(prev_tags_set, anals)
-                else:
-                    return self.next_for_guessed_token(prev_tags_set, lword, isupper, anals, isoov)
+        return seen, word_prob_model, word_form, is_spec, tags, tuple(anals), isoov, lword, isupper
+
+    def word_cache_info(self):
+        # A szóosztályozó cache találatai és hibái (hits, misses, maxsize, currsize).
+        return self.word_classes.cache_info()
 
     def next_for_eos_token(self, prev_tags_set: set) -> dict:
         ret = dict()
         for prev_tags in prev_tags_set:
             eos_prob = self.model.compiled_data.tag_transition_model.log_prob(
-                prev_tags.token_list, self.model.data.eos_index)
+                self.packer.unpack(prev_tags), self.model.data.eos_index)
             r = dict()
             r[self.model.data.eos_index] = (eos_prob, EOS_EMISSION_PROB)
             ret[prev_tags] = r
@@ -174,10 +188,10 @@ class BaseDecoder:
         ret = dict()
         for prev_tags in prev_tags_set:
             tag_probs = dict()
+            context = self.packer.unpack(prev_tags)
             for tag in tagset:
-                tag_prob = self.model.compiled_data.tag_transition_model.log_prob(
-                    prev_tags.token_list, tag)
-                act_tags = list(prev_tags.token_list)
+                tag_prob = self.model.compiled_data.tag_transition_model.log_prob(context, tag)
+                act_tags = list(context)
                 act_tags.append(tag)
                 emission_prob = word_prob_model.log_prob(act_tags, word_form)
                 # ez nem kell, mert nem -inf lesz, hanem 99
@@ -207,15 +221,14 @@ class BaseDecoder:
                                    lword: str,
                                    guesser: HashSuffixGuesser):
         rrr = dict()
-        tag_probs = dict()
-        guessed_tags = guesser.tag_log_probabilities(lword)
-        pruned_guessed_tags = self.prune_guessed_tags(guessed_tags)
+        pruned_guessed_tags = guesser.pruned_tag_log_probabilities(lword, self.suf_theta,
+                                                                   self.max_guessed_tags)
         for prev_tags in prev_tags_set:
-            for guess in pruned_guessed_tags:
-                emission_prob = guess[1]
-                tag = guess[0]
+            tag_probs = dict()
+            context = self.packer.unpack(prev_tags)
+            for tag, emission_prob in pruned_guessed_tags:
                 tag_trans_prob = self.model.compiled_data.tag_transition_model.log_prob(
-                    prev_tags.token_list, tag)
+                    context, tag)
                 apriori_prob = math.log(self.model.compiled_data.apriori_tag_probs[tag])
                 tag_probs[tag] = (tag_trans_prob, emission_prob - apriori_prob)
             rrr[prev_tags] = tag_probs
@@ -225,17 +238,15 @@ class BaseDecoder:
                                    lword: str,
                                    anals: list or set,
                                    guesser: HashSuffixGuesser) -> dict:
-        rrr = dict()
-        tag_probs = dict()
+        rrr = {prev_tags: dict() for prev_tags in prev_tags_set}
         possible_tags = anals
         for tag in possible_tags:
             new_tag = guesser.mapper.map(tag)
             if new_tag > self.model.data.tag_vocabulary.max_index():
                 emission_prob = UNKNOWN_TAG_WEIGHT
                 transition_prob = UNKOWN_TAG_TRANSITION
-                tag_probs[tag] = (transition_prob, emission_prob)
                 for prev_tags in prev_tags_set:
-                    rrr[prev_tags] = tag_probs
+                    rrr[prev_tags][tag] = (transition_prob, emission_prob)
             else:
                 apriori_prob = self.model.compiled_data.apriori_tag_probs[new_tag]
                 log_apriori_prob = math.log(apriori_prob)
@@ -246,9 +257,8 @@ class BaseDecoder:
                     emission_prob = tag_log_prob - log_apriori_prob
                 for prev_tags in prev_tags_set:
                     transition_prob = self.model.compiled_data.tag_transition_model.log_prob(
-                        prev_tags.token_list, tag)
-                    tag_probs[tag] = (transition_prob, emission_prob)
-                    rrr[prev_tags] = tag_probs
+                        self.packer.unpack(prev_tags), tag)
+                    rrr[prev_tags][tag] = (transition_prob, emission_prob)
         return rrr
 
     def next_for_single_tagged_token(self, prev_tags_set: set,
@@ -259,7 +269,7 @@ class BaseDecoder:
             # tag = anals[0]. Ez setre és listre is működik.
             tag = anals.__iter__().__next__()
             tag_prob = self.model.compiled_data.tag_transition_model.log_prob(
-                prev_tags.token_list, tag)
+                self.packer.unpack(prev_tags), tag)
             # Itt nem -99 a default, hanem 0
             tag_prob = tag_prob if tag_prob != UNKNOWN_VALUE else 0
             tag_probs[tag] = (tag_prob, 0.0)
@@ -280,40 +290,30 @@ class BaseDecoder:
                 return common
         return tags
 
-    def prune_guessed_tags(self, guessed_tags: dict) -> set:  # set of pairs
+    def prune_guessed_tags(self, guessed_tags: dict) -> list:  # list of pairs
         # A legnagyobb valószínűségű tag-eket kiszedi, hogy az ismeretlen szavak taggelésénél ne
-        # vezessenek félre. // „TnT – A Statistical Part-of-Speech Tagger” Brants, Thorsen 2000
-        # 2.3, 4)
-        s = set()
-        max_tag = HashSuffixGuesser.max_probability_tag(guessed_tags)
-        max_val = guessed_tags[max_tag]
-        min_val = max_val - self.suf_theta
-        for k, v in guessed_tags.items():
-            if v > min_val:
-                s.add((k, v))
-        if len(s) > self.max_guessed_tags:
-            l = list(s)
-            l.sort(key=lambda ent: ent[1], reverse=True)
-            for e in l:
-                if len(s) <= self.max_guessed_tags:
-                    break
-                s.remove(e)
-        return s
+        # vezessenek félre. (A guesser suffixenként előre elvégzi, ld. next_for_guessed_oov_token.)
+        return HashSuffixGuesser.prune_tags(guessed_tags, self.suf_theta, self.max_guessed_tags)
 
     @staticmethod
-    def decompose(node: Node) -> list:
+    def decompose(history: History) -> list:
         stack = list()
-        act = node
-        prev = node.prev
+        act = history
+        prev = history.prev
         while prev is not None:
-            stack.insert(0, act.state.last())
+            stack.append(NGramPacker.last(act.state))
             act = prev
             prev = act.prev
+        stack.reverse()
         return stack
 
-    def decode(self, observations: list, max_res_num: int) -> list:
+    def decode(self, observations: list, max_res_num: int, user_anals: AnalysisQueue=None) -> list:
         pass
 
+    def decode_batch(self, observations_list: list, max_res_num: int) -> list:
+        # Több mondat dekódolása, a bemenet sorrendjében. Alapesetben egyenként.
+        return [self.decode(observations, max_res_num) for observations in observations_list]
+
     @staticmethod
     def clean_results(tag_seq_list: list) -> list:  # [([int],float)]
         # A taglistákról leszedi az utolsó, MONDATVÉGE token tag-jét.
@@ -331,99 +331,71 @@ class BaseDecoder:
         obs.append(ModelData.EOS_TOKEN)
         return obs
 
-    def create_initial_element(self) -> NGram:
+    def create_initial_element(self) -> int:
         n = self.model.data.tagging_order
         start_tags = [self.model.data.bos_index for _ in range(0, n)]
-        start_ngram = NGram(start_tags, self.model.data.tagging_order)
-        return start_ngram
-
-    @staticmethod
-    def start_node(start: NGram) -> Node:
-        return Node(start, 0.0, None)
+        return self.packer.pack(start_tags)
 
 
 class BeamSearch(BaseDecoder):
     # BeamSearch algorithm.
-    # Nincs tesztelve.
+    # Az állapotokat nem vonja össze: pozíciónként a beam_size legjobb hipotézist tartja meg (ezek
+    # közül is csak a legjobbnál legfeljebb log_theta-val rosszabbakat).
+    DEFAULT_BEAM_SIZE = 10
+
     def __init__(self, model: CompiledModel,
                  morph_analyser: BaseMorphologicalAnalyser,
                  log_theta: float,
                  suf_theta: float,
                  max_guessed_tags: int,
                  beam_size: int=None):
-        if beam_size is None:
-            super().__init__(model, morph_analyser, log_theta, suf_theta, max_guessed_tags)
-            self.beam_size = 10
-            self.fixed_beam = False
-        else:
-            super().__init__(model, morph_analyser, 0, suf_theta, max_guessed_tags)
-            self.beam_size = beam_size
-            self.fixed_beam = True
+        super().__init__(model, morph_analyser, log_theta, suf_theta, max_guessed_tags)
+        self.beam_size = beam_size if beam_size is not None else self.DEFAULT_BEAM_SIZE
 
-    def decode(self, observations: list, max_res_num: int) -> list:
+    def decode(self, observations: list, max_res_num: int, user_anals: AnalysisQueue=None) -> list:
         observations = self.prepare_observations(observations)
-        beam = self.beam_search(observations)
-        return self.k_top(beam, max_res_num)
+        beam = self.beam_search(observations, user_anals)
+        return self.clean_results(self.k_top(beam, max_res_num))  # [([int],float)]
 
     def k_top(self, beam: list, max_res_num: int) -> list:
-        ret = []
-        for i in range(min(max_res_num, len(beam))):
-            # h = beam[-1]
-            # beam[-1:] = []
-            h = beam.pop()
-            tag_seq = h.tag_seq.token_list
-            cleaned = self.clean(tag_seq)
-            ret.append((cleaned, h.log_prob))
-        return ret
-
-    def clean(self, tag_seq: list) -> list:
-        return tag_seq[self.model.data.tagging_order:]
+        # A beam csökkenő sorrendben van.
+        return [(self.decompose(h), h.log_prob) for h in beam[:max_res_num]]
 
-    def beam_search(self, observations: list) -> list:
+    def beam_search(self, observations: list, user_anals: AnalysisQueue=None) -> list:
         beam = self.init_beam()
         position = 0
         for word in observations:
             contexts = self.collect_contexts(beam)
-            probs = self.next_probs(contexts, word, position, (position == 0))
+            probs = self.next_probs(contexts, word, position, (position == 0), user_anals)
             beam = self.update_beam(beam, probs)
-            self.prune(beam)
+            beam = self.prune(beam)
             position += 1
         return beam
 
     @staticmethod
     def collect_contexts(beam: list) -> set:
-        return {h.tag_seq for h in beam}  # trololob :) inline?
-
-    @staticmethod
-    def update_beam(beam, probs: dict) -> list:
-        new_beam = []
-        for h in beam:
-            context = h.tag_seq
-            old_prob = h.log_prob
-            transitions = probs[context]
-            for next_tag, prob_vals in transitions.items():
-                new_seq = context.add(next_tag)
-                new_prob = old_prob + prob_vals[0] + prob_vals[1]
-                new_beam.append(History(new_seq, new_prob))
-        new_beam.sort()
-        return new_beam
-
-    def prune(self, beam: list):
-        if self.fixed_beam:
-            beam[:-self.beam_size] = []  # trololo :)
-        else:
-            maxh = beam[-1]
-            while not beam[0].log_prob > (maxh.log_prob - self.log_theta):
-                beam[0:1] = []
+        return {h.state for h in beam}  # trololob :) inline?
+
+    def update_beam(self, beam: list, probs: dict) -> list:
+        # Korlátos kupac: csak a beam_size legjobb kiterjesztésből lesz History, csökkenő
+        # sorrendben (egyenlőségnél a korábbi előbb).
+        # Mint a BeamedViterbi-ben: egyetlen átmenetnél nincs emissziós valószínűség.
+        with_emission = sum(len(transitions) for transitions in probs.values()) > 1
+        expansions = ((h.log_prob + prob_vals[0] + (prob_vals[1] if with_emission else 0.0),
+                       h, next_tag)
+                      for h in beam for next_tag, prob_vals in probs[h.state].items())
+        best = heapq.nlargest(self.beam_size, expansions, key=lambda e: e[0])
+        return [History(self.packer.add(h.state, next_tag), new_prob, h)
+                for new_prob, h, next_tag in best]
+
+    def prune(self, beam: list) -> list:
+        # A legjobbnál log_theta-nál többel rosszabbak elhagyása.
+        min_prob = beam[0].log_prob - self.log_theta
+        return [h for h in beam if h.log_prob >= min_prob]
 
     def init_beam(self) -> list:
-        beam = []
         init_ngram = self.create_initial_element()
-        # NÖVEKVŐ SORREND LESZ! [0, 1, 2, 3, 4 ...]
-        beam.append(History(init_ngram, 0.0))
-
-# def create_initial_element(self) -> NGram:
-#     pass
+        return [History(init_ngram, 0.0)]
 
 
 class BeamedViterbi(BaseDecoder):
@@ -431,92 +403,102 @@ class BeamedViterbi(BaseDecoder):
                  morph_analyser: BaseMorphologicalAnalyser,
                  log_theta: float,
                  suf_theta: float,
-                 max_guessed_tags: int):
+                 max_guessed_tags: int,
+                 beam_width: int=None):
         super().__init__(model, morph_analyser, log_theta, suf_theta, max_guessed_tags)
+        # Legfeljebb ennyi állapot marad pozíciónként a beam-ben (None: nincs korlát).
+        self.beam_width = beam_width
 
-    def decode(self, observations: list, max_res_num: int) -> list:
+    def decode(self, observations: list, max_res_num: int, user_anals: AnalysisQueue=None) -> list:
         # Ez a lényeg, ezt hívuk meg kívülről.
         # A modathoz (observations) max_res_num-nyi tag-listát készít
         obs_sentence = self.prepare_observations(observations)
         start_ngram = self.create_initial_element()
-        tag_seq_list = self.beamed_search(start_ngram, obs_sentence, max_res_num)
+        tag_seq_list = self.beamed_search(start_ngram, obs_sentence, max_res_num, user_anals)
         return self.clean_results(tag_seq_list)  # [([int],float)]
 
-    def beamed_search(self, start: NGram,
+    def beamed_search(self, start: int,
                       observations: list,  # [str]
-                      results_num: int) -> list:
-        # Maga az algoritmus
-        beam = dict()                    # {NGram -> Node}
-        beam[start] = self.start_node(start)
+                      results_num: int,
+                      user_anals: AnalysisQueue=None) -> list:
+        # Maga az algoritmus. A rács (az összes pozíció megtartott állapotai) két tömbben van: az
+        # állapotok utolsó tag-jei és a megelőző állapotok indexei ugyanezekben a tömbökben.
+        lattice = (array("l"), array("l"))  # (tags, backpointers), -1: a kezdőállapot
+        states = [start]                 # [int] az aktuális beam állapotai
+        weights = array("d", [0.0])      # az állapotok súlyai
+        ids = array("l", [-1])           # az állapotok indexei a rácsban
         first = True
         pos = 0
         for obs in observations:         # obs: str
-            new_beam = dict()            # {NGram -> Node}
-            next_probs = dict()          # table: {(NGram, int) -> float} trololo :)
-            obs_probs = dict()           # {NGram -> float}
-            contexts = set(beam.keys())  # {NGram}
-            nexts = self.next_probs(contexts, obs, pos, first)  # {NGram -> {int -> (float, float)}}
+            index = {state: i for i, state in enumerate(states)}  # {int -> int}
+            nexts = self.next_probs(set(states), obs, pos, first,
+                                    user_anals)  # {int -> {int -> (float, float)}}
+            new_index = dict()           # {int -> int}
+            new_states = []              # [int]
+            new_weights = array("d")
+            backs = array("l")
+            obs_probs = dict()           # {int -> float}
+            cells = 0
             for context, next_context_probs in nexts.items():
-                # context: NGram,
+                # context: int,
                 # next_context_probs: {int -> (float, float)}
+                from_id = index[context]
+                from_weight = weights[from_id]
                 for tag, pair in next_context_probs.items():    # {int -> (float, float)}.items()
-                    next_probs[(context, tag)] = pair[0]
-                    obs_probs[context.add(tag)] = pair[1]
-
-            for cell_index, trans_val in next_probs.items():    # {(NGram, int) -> float}.items()
-                next_tag = cell_index[1]            # int
-                context = cell_index[0]             # NGram
-                new_state = context.add(next_tag)   # NGram
-                from_node = beam[context]           # Node
-                new_val = trans_val + from_node.weight  # float
-                self.update(new_beam, new_state, new_val, from_node)  # todo változik?
+                    cells += 1
+                    new_state = self.packer.add(context, tag)  # int
+                    obs_probs[new_state] = pair[1]
+                    new_val = pair[0] + from_weight             # float
+                    # Hozzá veszi, ha nincs benn ilyen végű tag sorozat, egyébként a jobb győz.
+                    i = new_index.get(new_state)
+                    if i is None:
+                        new_index[new_state] = len(new_states)
+                        new_states.append(new_state)
+                        new_weights.append(new_val)
+                        backs.append(from_id)
+                    elif new_weights[i] < new_val:
+                        new_weights[i] = new_val
+                        backs[i] = from_id
             # adding observation probabilities
-            if len(next_probs) > 1:
-                for tag_seq in new_beam.keys():     # {NGram -> Node}.keys()
-                    # new_beam[tag_seq].weight += obs_probs[tag_seq]
-                    node = new_beam[tag_seq]
-                    obs_prob = obs_probs[tag_seq]
-                    node.weight += obs_prob
-
-            beam = self.prune(new_beam)
+            if cells > 1:
+                for i, new_state in enumerate(new_states):
+                    new_weights[i] += obs_probs[new_state]
+
+            kept = self.prune(new_weights)
+            states = [new_states[i] for i in kept]
+            weights = array("d", (new_weights[i] for i in kept))
+            offset = len(lattice[0])
+            lattice[0].extend(NGramPacker.last(state) for state in states)
+            lattice[1].extend(ids[backs[i]] for i in kept)
+            ids = array("l", range(offset, len(lattice[0])))
             first = False
             pos += 1
-        return self.find_max(beam, results_num)  # [([int],float)]?
-
-    def find_max(self, beam: dict,              # {NGram -> Node}
-                 results_num: int) -> list:
-        sorted_nodes = sorted(beam.values(), key=lambda node: node.weight)  # [Node]
-        ret = []
-        for i in range(results_num):
-            if len(sorted_nodes) == 0:
-                break
-            max_node = sorted_nodes.pop()
-            max_tag_seq = self.decompose(max_node)
-            ret.append((max_tag_seq, max_node.weight))
-        return ret  # [([int],float)]
-
-    def prune(self, beam: dict) -> dict:
-        # Egy küszöb súly alatti node-okat nem veszi be a beam-be.
-        # A küszöböt a max súlyú node-ból számolja ki.
-        ret = dict()
-        max_node = max(beam.values(), key=lambda n: n.weight)
-        for ngram, act_node in beam.items():
-            if act_node.weight >= max_node.weight - self.log_theta:
-                ret[ngram] = act_node
-        return ret  # dict: {NGram -> Node}
+        return self.find_max(lattice, ids, weights, results_num)  # [([int],float)]
 
     @staticmethod
-    def update(beam: dict,  # {NGram -> Node}
-               new_state: NGram,
-               new_weight: float,
-               from_node: Node):
-        # Hozzá veszi, ha nincs benn ilyen végű(*) tag sorozat.
-        # (*) Csak at utolsó két elemet veszi figyelembe az egyezésvizsgálatkor!
-        if new_state not in beam.keys():
-            beam[new_state] = Node(new_state, new_weight, from_node)
-        # Ha már benne van, akkor módosítja a node-ot.
-        elif beam[new_state].weight < new_weight:
-            beam[new_state].prev = from_node
-            beam[new_state].weight = new_weight
-        else:
-            pass
+    def find_max(lattice: tuple, ids: array, weights: array, results_num: int) -> list:
+        # Egyenlő súlyok esetén a később felvett állapot nyer.
+        ranked = sorted(range(len(weights)), key=lambda i: weights[i])[::-1][:results_num]
+        return [(BeamedViterbi.backtrack(lattice, ids[i]), weights[i])
+                for i in ranked]  # [([int],float)]
+
+    @staticmethod
+    def backtrack(lattice: tuple, i: int) -> list:
+        # A rács i. állapotába vezető tag sorozat.
+        tags, backs = lattice
+        tag_seq = []
+        while i >= 0:
+            tag_seq.append(tags[i])
+            i = backs[i]
+        tag_seq.reverse()
+        return tag_seq
+
+    def prune(self, weights: array) -> list:
+        # Egy küszöb súly alatti állapotokat nem veszi be a beam-be (a megmaradók indexei).
+        # A küszöböt a max súlyból számolja ki.
+        min_weight = max(weights) - self.log_theta
+        kept = [i for i, weight in enumerate(weights) if weight >= min_weight]
+        if self.beam_width is not None and len(kept) > self.beam_width:
+            # Hisztogram metszés: a beam_width legjobb marad (egyenlőségnél a korábbi), sorrendben.
+            kept = sorted(heapq.nlargest(self.beam_width, kept, key=weights.__getitem__))
+        return kept
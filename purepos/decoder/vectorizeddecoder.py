@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8, vim: expandtab:ts=4 -*-
+###############################################################################
+# Copyright (c) 2015 Móréh, Tamás
+# All rights reserved. This program and the accompanying materials
+# are made available under the terms of the GNU Lesser Public License v3
+# which accompanies this distribution, and is available at
+# http://www.gnu.org/licenses/
+#
+# This file is part of PurePos-Python3.
+#
+# PurePos-Python3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PurePos-Python3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser Public License for more details.
+#
+# Contributors:
+#     Móréh, Tamás - initial API and implementation
+##############################################################################
+
+__author__ = 'morta@digitus.itk.ppke.hu'
+
+try:
+    import numpy
+except ImportError:  # A NumPy opcionális, csak ehhez a dekóderhez kell.
+    numpy = None
+from purepos.common.analysisqueue import AnalysisQueue
+from purepos.decoder.basedecoder import BeamedViterbi
+
+
+class VectorizedViterbi(BeamedViterbi):
+    """BeamedViterbi with NumPy score arrays.
+    Every beam step is stored in flat (context, tag) score arrays, the max-reduction over the
+    contexts which lead to the same state is done by NumPy. Ties are broken the same way as in
+    BeamedViterbi, so the results are identical.
+    Sentences of the same length can be decoded in lockstep: their beams are stacked into the
+    same arrays, so one reduction advances all of them by one position.
+    """
+    def beamed_search(self, start: int,
+                      observations: list,  # [str]
+                      results_num: int,
+                      user_anals: AnalysisQueue=None) -> list:
+        return self.lockstep_search(start, [observations], results_num, [user_anals])[0]
+
+    def decode_batch(self, observations_list: list, max_res_num: int) -> list:
+        # Az azonos hosszú mondatokat együtt, pozícióról pozícióra dekódolja.
+        buckets = dict()                 # {hossz -> [index]}
+        for i, observations in enumerate(observations_list):
+            buckets.setdefault(len(observations), []).append(i)
+        ret = [None for _ in observations_list]
+        start_ngram = self.create_initial_element()
+        for ids in buckets.values():
+            obs_sentences = [self.prepare_observations(observations_list[i]) for i in ids]
+            tag_seq_lists = self.lockstep_search(start_ngram, obs_sentences, max_res_num)
+            for i, tag_seq_list in zip(ids, tag_seq_lists):
+                ret[i] = self.clean_results(tag_seq_list)
+        return ret
+
+    def lockstep_search(self, start: int,
+                        sentences: list,  # [[str]], azonos hosszúak
+                        results_num: int,
+                        user_anals_list: list=None) -> list:  # [AnalysisQueue] mondatonként
+        if user_anals_list is None:
+            user_anals_list = [None for _ in sentences]
+        states = [start for _ in sentences]  # [int], mondatonként egybefüggő szakaszokban
+        owners = numpy.arange(len(sentences))  # állapot -> mondat
+        weights = numpy.zeros(len(sentences))
+        lattice = []                     # [(tags, backpointers)] pozíciónként
+        for pos in range(len(sentences[0])):
+            contexts = []                # [int] next_probs sorrendjében (sorok)
+            from_ids = []                # sor -> states index
+            row_groups = []              # sor -> azonos végű kontextusok csoportja
+            with_emission = []           # sor -> hozzá kell-e adni az emissziós valószínűséget
+            groups = dict()
+            cell_rows, cell_tags, trans_vals, emission_vals = [], [], [], []
+            for sent, lo, hi in self.segments(owners):
+                index = {states[i]: i for i in range(lo, hi)}
+                nexts = self.next_probs(set(states[lo:hi]), sentences[sent][pos], pos, pos == 0,
+                                        user_anals_list[sent])
+                first_row, first_cell = len(contexts), len(cell_rows)
+                for context, tag_probs in nexts.items():
+                    row = len(contexts)
+                    contexts.append(context)
+                    from_ids.append(index[context])
+                    row_groups.append(groups.setdefault((sent, self.packer.tail(context)),
+                                                        len(groups)))
+                    for tag, pair in tag_probs.items():
+                        cell_rows.append(row)
+                        cell_tags.append(tag)
+                        trans_vals.append(pair[0])
+                        emission_vals.append(pair[1])
+                # Mint a BeamedViterbi-ben: egyetlen átmenetnél nincs emissziós valószínűség.
+                with_emission.extend(len(cell_rows) - first_cell > 1
+                                     for _ in range(len(contexts) - first_row))
+            weights, back, tags, first_rows = self.reduce(weights,
+                                                          numpy.asarray(from_ids),
+                                                          numpy.asarray(row_groups),
+                                                          numpy.asarray(with_emission),
+                                                          numpy.asarray(cell_rows),
+                                                          numpy.asarray(cell_tags),
+                                                          numpy.asarray(trans_vals),
+                                                          numpy.asarray(emission_vals))
+            owners = owners[back]
+            weights, back, tags, first_rows, owners = self.prune_arrays(weights, owners, back,
+                                                                        tags, first_rows)
+            states = [self.packer.add(contexts[r], int(t)) for r, t in zip(first_rows, tags)]
+            lattice.append((tags, back))
+        return [self.find_max_in_lattice(lattice, weights[lo:hi], lo, results_num)
+                for _, lo, hi in self.segments(owners)]
+
+    @staticmethod
+    def segments(owners) -> list:
+        # Az egy mondathoz tartozó állapotok (mondat, eleje, vége) szakaszai.
+        bounds = numpy.flatnonzero(numpy.concatenate(([True], owners[1:] != owners[:-1])))
+        ends = numpy.append(bounds[1:], len(owners))
+        return [(int(owners[lo]), int(lo), int(hi)) for lo, hi in zip(bounds, ends)]
+
+    @staticmethod
+    def reduce(weights, from_ids, row_groups, with_emission, cell_rows, cell_tags,
+               trans_vals, emission_vals) -> tuple:
+        # Az új állapotok (csoport, tag) párok. Egy állapotba a legjobb átmenet győz, egyenlőség
+        # esetén az elsőként látott (mint a BeamedViterbi-ben), az emissziós valószínűség
+        # viszont a legutoljára látott kontextusé (mint az obs_probs dict-ben).
+        cells = len(cell_rows)
+        keys = row_groups[cell_rows] * (int(cell_tags.max()) + 1) + cell_tags
+        scores = weights[from_ids[cell_rows]] + trans_vals
+        # Stabil rendezés: állapotonként a bejárási sorrendben maradnak az átmenetek.
+        order = numpy.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        bounds = numpy.flatnonzero(numpy.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+        lengths = numpy.diff(bounds, append=cells)
+        sorted_scores = scores[order]
+        best = numpy.maximum.reduceat(sorted_scores, bounds)
+        is_best = sorted_scores == numpy.repeat(best, lengths)
+        best_cells = order[numpy.minimum.reduceat(numpy.where(is_best, numpy.arange(cells), cells),
+                                                  bounds)]
+        first_cells = order[bounds]
+        last_cells = order[bounds + lengths - 1]
+
+        # Az új beam a next_probs bejárási sorrendjében tartalmazza az állapotokat.
+        beam_order = numpy.argsort(first_cells)
+        best, best_cells = best[beam_order], best_cells[beam_order]
+        first_cells, last_cells = first_cells[beam_order], last_cells[beam_order]
+        first_rows = cell_rows[first_cells]
+        new_weights = numpy.where(with_emission[first_rows], best + emission_vals[last_cells], best)
+        back = from_ids[cell_rows[best_cells]]
+        return new_weights, back, cell_tags[first_cells], first_rows
+
+    def prune_arrays(self, weights, owners, *arrays) -> tuple:
+        # Ugyanaz, mint a BeamedViterbi.prune, csak tömbökön, mondatonként külön maximummal.
+        bounds = numpy.flatnonzero(numpy.concatenate(([True], owners[1:] != owners[:-1])))
+        max_weights = numpy.maximum.reduceat(weights, bounds)
+        lengths = numpy.diff(bounds, append=len(weights))
+        keep = weights >= numpy.repeat(max_weights, lengths) - self.log_theta
+        if self.beam_width is not None:
+            for _, lo, hi in self.segments(owners):
+                self.limit_width(weights, keep[lo:hi], lo)
+        return (weights[keep],) + tuple(a[keep] for a in arrays) + (owners[keep],)
+
+    def limit_width(self, weights, keep, offset: int):
+        # Hisztogram metszés egy mondatra: a beam_width legjobb marad, egyenlőségnél a korábbiak,
+        # mint a heapq.nlargest-nél. A küszöböt lineáris idejű kiválasztás adja.
+        ids = numpy.flatnonzero(keep)
+        extra = len(ids) - self.beam_width
+        if extra <= 0:
+            return
+        kept_weights = weights[ids + offset]
+        kth = numpy.partition(kept_weights, extra)[extra]
+        selected = kept_weights > kth
+        ties = numpy.flatnonzero(kept_weights == kth)
+        selected[ties[:self.beam_width - numpy.count_nonzero(selected)]] = True
+        keep[ids[~selected]] = False
+
+    @staticmethod
+    def find_max_in_lattice(lattice: list, weights, offset: int, results_num: int) -> list:
+        # Stabil rendezés, a legnagyobbtól visszafelé: egyenlőségnél a később felvett nyer.
+        ranked = numpy.argsort(weights, kind="stable")[::-1][:results_num]
+        ret = []
+        for i in ranked:
+            weight = float(weights[i])
+            i += offset
+            tag_seq = []
+            for tags, back in reversed(lattice):
+                tag_seq.append(int(tags[i]))
+                i = back[i]
+            tag_seq.reverse()
+            ret.append((tag_seq, weight))
+        return ret  # [([int],float)]
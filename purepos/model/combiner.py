@@ -25,10 +25,11 @@
 
 __author__ = 'morta@digitus.itk.ppke.hu'
 
+import multiprocessing
 from docmodel.containers import Document
 from docmodel.token import Token
 from purepos.common import lemma
-from purepos.common.util import UNKOWN_VALUE, CONFIGURATION
+from purepos.common.util import UNKOWN_VALUE
 from purepos.common.lemmatransformation import BaseLemmaTransformation
 from purepos.model.modeldata import ModelData
 from purepos.model.rawmodeldata import RawModelData
@@ -40,6 +41,22 @@ def default_combiner():
     return LogLinearBiCombiner()
 
 
+# A párhuzamos paraméterbecslés munkafolyamatai a forkkal öröklik (ld.
+# LogLinearBiCombiner.parallel_token_props).
+_worker_scoring = None
+
+
+def _score_words(start: int, end: int) -> list:
+    groups, lemma_suffix_guesser, raw_modeldata, modeldata = _worker_scoring
+    ret = []
+    for tokens in groups[start:end]:
+        word_props = LogLinearBiCombiner.word_props(tokens[0].token, lemma_suffix_guesser,
+                                                    raw_modeldata, modeldata)
+        ret.append([LogLinearBiCombiner.token_props(tok, word_props, raw_modeldata)
+                    for tok in tokens])
+    return ret
+
+
 class BaseCombiner:
     # A guesserből és az unigram modellből (?) származó adatok kombinálásához.
     # Valószínüleg a smoothinggal kapcsolatos
@@ -52,43 +69,63 @@ class BaseCombiner:
 
     def calculate_params(self, doc: Document,
                          raw_modeldata: RawModelData,
-                         modeldata: ModelData):
+                         modeldata: ModelData,
+                         jobs: int=1):
         pass
 
+    def merge(self, other, weight: float, other_weight: float):
+        # Külön tanított modellek összevonásakor (ld. RawModel.merge_trained) a paraméterek a
+        # tanítókorpuszaik méretével súlyozott átlaga. A becsléshez a teljes korpusz kellene.
+        if weight <= 0 or len(self.lambdas) == 0:
+            self.lambdas = list(other.lambdas)
+        elif other_weight > 0:
+            s = weight + other_weight
+            self.lambdas = [(own * weight + oth * other_weight) / s
+                            for own, oth in zip(self.lambdas, other.lambdas)]
+
     def combine(self, token: Token,
                 lem_transf: BaseLemmaTransformation,
                 compiled_modeldata: CompiledModelData,
-                modeldata: ModelData) -> float:
+                modeldata: ModelData,
+                weight: float=None) -> float:
         pass
 
+    def combine_all(self, pairs: list,
+                    suffix_log_probs: dict,
+                    compiled_modeldata: CompiledModelData,
+                    modeldata: ModelData,
+                    weight: float=None) -> list:
+        # Egy szó összes (token, lemmatranszformáció) jelöltjének pontszáma. A suffix_log_probs a
+        # szó lemma_guesser.tag_log_probabilities eloszlása, amit így nem kell jelöltenként
+        # újraszámolni. Alapesetben jelöltenként a combine.
+        return [self.combine(token, lem_transf, compiled_modeldata, modeldata, weight)
+                for token, lem_transf in pairs]
+
 
 class LogLinearBiCombiner(BaseCombiner):
     def calculate_params(self, doc: Document,
                          raw_modeldata: RawModelData,
-                         modeldata: ModelData):
+                         modeldata: ModelData,
+                         jobs: int=1):
         apriori_probs = raw_modeldata.tag_ngram_model.word_apriori_probs()
         theta = HashSuffixTree.calculate_theta(apriori_probs)
         lemma_suffix_guesser = raw_modeldata.lemma_suffix_tree.create_guesser(theta)
         lambda_s = 1.0
         lambda_u = 1.0
+        # A (szó, lemma, tag) hármasok pontszáma csak egyszer számolódik, az összegzés viszont
+        # tokenenként, a korpusz sorrendjében marad, így a lambdák bitre azonosak.
+        props = dict()
+        if jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+            props = self.parallel_token_props(doc, lemma_suffix_guesser, raw_modeldata,
+                                              modeldata, jobs)
         for sentence in doc.sentences():
             for tok in sentence:
-                suffix_probs = lemma.batch_convert(lemma_suffix_guesser.tag_log_probabilities(
-                    tok.token), tok.token, modeldata.tag_vocabulary)
-                uni_probs = dict()
-                for t in suffix_probs.keys():
-                    uniscore = raw_modeldata.lemma_unigram_model.log_prob(t.stem)
-                    uni_probs[t] = uniscore
-                uni_max = max(uni_probs.items(), key=lambda e: e[1])
-                t = max(suffix_probs.items(), key=lambda e: e[1][1])
-                suffix_max = (t[0], t[1][1])
-                act_uni_prob = raw_modeldata.lemma_unigram_model.log_prob(tok.stem)
-                if tok in suffix_probs.keys():
-                    act_suff_prob = suffix_probs[tok][1]
-                else:
-                    act_suff_prob = UNKOWN_VALUE
-                uni_prop = act_uni_prob - uni_max[1]
-                suff_prop = act_suff_prob - suffix_max[1]
+                prop = props.get(tok)
+                if prop is None:
+                    prop = props[tok] = self.token_props(
+                        tok, self.word_props(tok.token, lemma_suffix_guesser, raw_modeldata,
+                                             modeldata), raw_modeldata)
+                uni_prop, suff_prop = prop
                 if uni_prop > suff_prop:
                     lambda_u += uni_prop - suff_prop
                 elif suff_prop > uni_prop:
@@ -100,33 +137,102 @@ class LogLinearBiCombiner(BaseCombiner):
         self.lambdas.append(lambda_u)
         self.lambdas.append(lambda_s)
 
+    def parallel_token_props(self, doc: Document, lemma_suffix_guesser,
+                             raw_modeldata: RawModelData, modeldata: ModelData,
+                             jobs: int) -> dict:
+        # Egy külön menetben összegyűjtött hármasok pontozása szavanként csoportosítva, jobs
+        # folyamatban. A guessert és a modellt a munkafolyamatok a forkkal öröklik.
+        global _worker_scoring
+        words = dict()  # szó -> hármasai (dict mint rendezett halmaz)
+        for sentence in doc.sentences():
+            for tok in sentence:
+                tokens = words.get(tok.token)
+                if tokens is None:
+                    tokens = words[tok.token] = dict()
+                tokens[tok] = None
+        groups = [list(tokens) for tokens in words.values()]
+        chunk = len(groups) // (jobs * 4) + 1
+        ranges = [(start, min(start + chunk, len(groups)))
+                  for start in range(0, len(groups), chunk)]
+        _worker_scoring = (groups, lemma_suffix_guesser, raw_modeldata, modeldata)
+        try:
+            with multiprocessing.get_context("fork").Pool(jobs) as pool:
+                results = pool.starmap(_score_words, ranges)
+        finally:
+            _worker_scoring = None
+        props = dict()
+        for (start, end), result in zip(ranges, results):
+            for tokens, token_props in zip(groups[start:end], result):
+                props.update(zip(tokens, token_props))
+        return props
+
+    @staticmethod
+    def word_props(word: str, lemma_suffix_guesser, raw_modeldata: RawModelData,
+                   modeldata: ModelData) -> tuple:
+        # A szó lemmajelöltjei és a legjobb jelölt unigram és suffix pontszáma.
+        suffix_probs = lemma.batch_convert(lemma_suffix_guesser.tag_log_probabilities(word),
+                                           word, modeldata.tag_vocabulary)
+        uni_probs = dict()
+        for t in suffix_probs.keys():
+            uniscore = raw_modeldata.lemma_unigram_model.log_prob(t.stem)
+            uni_probs[t] = uniscore
+        uni_max = max(uni_probs.items(), key=lambda e: e[1])
+        t = max(suffix_probs.items(), key=lambda e: e[1][1])
+        return suffix_probs, uni_max[1], t[1][1]
+
+    @staticmethod
+    def token_props(tok: Token, word_props: tuple, raw_modeldata: RawModelData) -> tuple:
+        # A token lemmájának unigram és suffix pontszáma a szó legjobb jelöltjéhez képest.
+        suffix_probs, uni_max, suffix_max = word_props
+        act_uni_prob = raw_modeldata.lemma_unigram_model.log_prob(tok.stem)
+        if tok in suffix_probs.keys():
+            act_suff_prob = suffix_probs[tok][1]
+        else:
+            act_suff_prob = UNKOWN_VALUE
+        return act_uni_prob - uni_max, act_suff_prob - suffix_max
+
     def combine(self, token: Token,
                 lem_transf: BaseLemmaTransformation,
                 compiled_modeldata: CompiledModelData,
-                modeldata: ModelData) -> float:
+                modeldata: ModelData,
+                weight: float=None) -> float:
         unigram_lemma_model = compiled_modeldata.unigram_lemma_model
         uni_score = unigram_lemma_model.log_prob(token.stem)
         suffix_score = compiled_modeldata.lemma_guesser.tag_log_probability(token.token, lem_transf)
-        uni_lambda = self.lambdas[0]
-        suffix_lambda = self.lambdas[1]
-        if CONFIGURATION is not None and CONFIGURATION.weight is not None:
-            suffix_lambda = CONFIGURATION.weight
-            uni_lambda = 1 - suffix_lambda
-
+        uni_lambda, suffix_lambda = self.mixing_weights(weight)
         return uni_score * uni_lambda + suffix_score * suffix_lambda
 
+    def combine_all(self, pairs: list,
+                    suffix_log_probs: dict,
+                    compiled_modeldata: CompiledModelData,
+                    modeldata: ModelData,
+                    weight: float=None) -> list:
+        # A lemma guessernek nincs mappere, így a tag_log_probability a szó eloszlásából olvasható.
+        uni_log_prob = compiled_modeldata.unigram_lemma_model.log_prob
+        uni_lambda, suffix_lambda = self.mixing_weights(weight)
+        return [uni_log_prob(token.stem) * uni_lambda +
+                suffix_log_probs.get(lem_transf, UNKOWN_VALUE) * suffix_lambda
+                for token, lem_transf in pairs]
+
+    def mixing_weights(self, weight: float=None) -> tuple:
+        if weight is not None:  # A konfigurációban megadott súly (suffix_model_weight).
+            return 1 - weight, weight
+        return self.lambdas[0], self.lambdas[1]
+
 # Csak a BiCombinert használjuk, ami innen jön, dead code.
 
 class LogLinearMLCombiner(BaseCombiner):
     def calculate_params(self, doc: Document,
                          raw_modeldata: RawModelData,
-                         modeldata: ModelData):
+                         modeldata: ModelData,
+                         jobs: int=1):
         self.lambdas = [0.0, 0.1]
 
     def combine(self, token: Token,
                 lem_transf: BaseLemmaTransformation,
                 compiled_modeldata: CompiledModelData,
-                modeldata: ModelData) -> float:
+                modeldata: ModelData,
+                weight: float=None) -> float:
         unigram_lemma_model = compiled_modeldata.unigram_lemma_model
         uni_score = unigram_lemma_model.log_prob(token.stem)
         suffix_score = compiled_modeldata.lemma_guesser.tag_log_probability(token.token, lem_transf)
@@ -136,7 +242,8 @@ class LogLinearMLCombiner(BaseCombiner):
 class LogLinearTriCombiner(BaseCombiner):
     def calculate_params(self, doc: Document,
                          raw_modeldata: RawModelData,
-                         modeldata: ModelData):
+                         modeldata: ModelData,
+                         jobs: int=1):
         apriori_probs = raw_modeldata.tag_ngram_model.word_apriori_probs()
         theta = HashSuffixTree.calculate_theta(apriori_probs)
         lemma_suffix_guesser = raw_modeldata.lemma_suffix_tree.create_guesser(theta)
@@ -188,7 +295,8 @@ class LogLinearTriCombiner(BaseCombiner):
     def combine(self, token: Token,
                 lem_transf: BaseLemmaTransformation,
                 compiled_modeldata: CompiledModelData,
-                modeldata: ModelData) -> float:
+                modeldata: ModelData,
+                weight: float=None) -> float:
         unigram_lemma_model = compiled_modeldata.unigram_lemma_model
         uni_score = unigram_lemma_model.log_prob(token.stem)
         suffix_score = compiled_modeldata.lemma_guesser.tag_log_probability(
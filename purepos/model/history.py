@@ -25,13 +25,13 @@
 
 __author__ = 'morta@digitus.itk.ppke.hu'
 
-from purepos.model.ngram import NGram
 
 
 class History:
-    def __init__(self, tag_seq: NGram, log_prob: float):
-        self.tag_seq = tag_seq
+    def __init__(self, state: int, log_prob: float, previous=None):
+        self.state = state  # NGramPacker-rel tömörített tag-ek
         self.log_prob = log_prob  # compare with.
+        self.prev = previous
 
     def __eq__(self, other):
         return self.log_prob == other.log_prob
@@ -39,6 +39,10 @@ class LemmaUnigramModel:
         else:
             self.counter_map[element] += 1
 
+    def merge(self, other):
+        for element, count in other.counter_map.items():
+            self.counter_map[element] = self.counter_map.get(element, 0) + count
+
     def count(self, element) -> int:
         return self.counter_map.get(element, 0)
 
@@ -47,18 +47,15 @@ class NGram:
 
     def init_hash(self) -> int:
         # Ennek a célja, hogy a hash kódot előre legyártsa, mert nagyon gyakran lesz rá szükség.
-        s = 0
+        # Az utolsó compare_length token helyiértékesen, tokenenként 32 biten. (A korábbi összeg
+        # a sorrendet nem vette figyelembe: egy n-gram minden permutációja ütközött.)
+        tokens = self.token_list
         if self.compare_length != -1:
-            size = self.compare_length
-        else:
-            size = float("inf")
-        c = 0
-        for tok in self.token_list[::-1]:
-            if c >= size:
-                break
-            s += tok*31  # prím szám.
-            c += 1
-        return s
+            tokens = tokens[max(0, len(tokens) - self.compare_length):]
+        s = 0
+        for tok in tokens:
+            s = (s << 32) | tok
+        return hash(s)
 
     def __eq__(self, other):
         # Az azonosságvizsgálatnál csak az utolsó n token(tag-e)-t vizsgáljuk
@@ -66,3 +63,38 @@ class NGram:
 
     def last(self):
         return self.token_list[-1]
+
+
+class NGramPacker:
+    """Packs the last n tags of a tag sequence into one int, TAG_BITS bits per tag (the newest
+    tag is the lowest). The decoders use these ints as beam states instead of NGram objects: they
+    are cheap to create, hash and compare, and two states are equal iff their last n tags are,
+    just like NGram(tags, n). The earlier tags are reached through the backpointers of the beam.
+    """
+    TAG_BITS = 32
+    TAG_MASK = (1 << TAG_BITS) - 1
+
+    def __init__(self, n: int):
+        self.n = n
+        self.mask = (1 << (self.TAG_BITS * n)) - 1
+        # Az utolsó n-1 tag: az ezekben egyező állapotok ugyanabba az új állapotba lépnek.
+        self.tail_mask = self.mask >> self.TAG_BITS
+
+    def pack(self, tags: list) -> int:
+        state = 0
+        for tag in tags[-self.n:]:
+            state = (state << self.TAG_BITS) | tag
+        return state
+
+    def unpack(self, state: int) -> list:
+        return [(state >> (self.TAG_BITS * i)) & self.TAG_MASK for i in range(self.n - 1, -1, -1)]
+
+    def add(self, state: int, tag: int) -> int:
+        return ((state << self.TAG_BITS) | tag) & self.mask
+
+    def tail(self, state: int) -> int:
+        return state & self.tail_mask
+
+    @staticmethod
+    def last(state: int) -> int:
+        return state & NGramPacker.TAG_MASK
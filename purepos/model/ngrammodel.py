@@ -49,6 +49,10 @@ class NGramModel:
         #     act = act.add_child(c)
         #     act.add_word(word)
 
+    def merge(self, other, tag_map: dict, words_are_tags: bool=False):
+        # Egy másik shardon számolt modell hozzáadása (ld. RawModel.merge).
+        self.root.merge(other.root, tag_map, tag_map if words_are_tags else None)
+
     def word_frequency(self, context: list, word) -> list:
         # dead code?
         ret = [self.root.apriori_prob(word), ]
@@ -64,49 +68,53 @@ class NGramModel:
         return ret
 
     @staticmethod
-    def calculate_modified_freq_val(node_list: list, position: int, word) -> float:
-        context_freq = node_list[position].num
-        word_freq = node_list[position].words[word]
+    def modified_freq_val(context_freq, word_freq) -> float:
         if context_freq == 1 or word_freq == 1:
             return -1
         else:
             return (word_freq - 1) / (context_freq - 1)
 
-    def find_max(self, l: list, word) -> tuple:
-        if l is None or len(l) == 0:
-            return None, None
-        # max_pos = -1
-        # max_val = 0.0
-        # for i, v in enumerate(l):
-        #     val = self.calculate_modified_freq_val(l, i, word)
-        #     if val > max_val:
-        #         max_pos = i
-        #         max_val = val
-        # egy sor.
-        t = max([(i, self.calculate_modified_freq_val(l, i, word)) for i, v in enumerate(l)],
-                key=lambda p: p[1])
-        return t  # max_pos, max_val
+    @staticmethod
+    def best_positions(node: TrieNode, depth: int, parent_best: dict or None) -> dict:
+        # A gyökértől node-ig vezető úton szavanként a legnagyobb módosított gyakoriság és az
+        # (első) ilyen csúcs mélysége: {szó: (mélység, érték)}. A szülő eredményéből számolva,
+        # így a csúcs minden szava egyszer számolódik, nem levelenként az egész úton.
+        ret = dict()
+        context_freq = node.num
+        for word, word_freq in node.words.items():
+            # modified_freq_val, függvényhívás nélkül.
+            if context_freq == 1 or word_freq == 1:
+                val = -1
+            else:
+                val = (word_freq - 1) / (context_freq - 1)
+            if parent_best is not None:
+                prev = parent_best[word]
+                if prev[1] >= val:  # Egyenlőségnél a korábbi marad (mint a max-nál).
+                    ret[word] = prev
+                    continue
+            ret[word] = (depth, val)
+        return ret
 
     def calculate_ngram_lambdas(self):
+        # Deleted interpolation: minden levél minden szavának gyakorisága ahhoz a rendhez adódik,
+        # ahol az úton a legnagyobb a módosított gyakorisága. Mélységi bejárás explicit veremmel
+        # (a gyerekek fordított sorrendben, hogy a rekurzív bejárás sorrendjében adódjanak össze).
         self.lambdas = [0.0 for _ in range(0, self.n + 1, 1)]
-        self.iterate(self.root, [])
+        stack = [(self.root, 0, None)]
+        while len(stack) > 0:
+            node, depth, parent_best = stack.pop()
+            best = self.best_positions(node, depth, parent_best)
+            if node.child_nodes is None or len(node.child_nodes) == 0:
+                for word, (position, val) in best.items():
+                    if val != -1:
+                        self.lambdas[position + 1] += node.words[word]
+            else:
+                for child in reversed(list(node.child_nodes.values())):
+                    stack.append((child, depth + 1, best))
         s = sum(self.lambdas)
         if s > 0:
             self.lambdas = [l / s for l in self.lambdas]
 
-    def iterate(self, node: TrieNode, acc: list):
-        acc.append(node)
-        if node.child_nodes is None or len(node.child_nodes) == 0:
-            for word in node.words.keys():
-                mx = self.find_max(acc, word)
-                index = mx[0] + 1
-                if mx[1] != -1:
-                    self.lambdas[index] = self.lambdas[index] + node.words.get(word)
-        else:
-            for child in node.child_nodes.values():
-                self.iterate(child, acc)
-        acc.pop()
-
     def create_probability_model(self) -> ProbModel:
         self.calculate_ngram_lambdas()
         return ProbModel(self.root, self.lambdas)
@@ -26,6 +26,7 @@
 __author__ = 'morta@digitus.itk.ppke.hu'
 
 import math
+from array import array
 from purepos.model.trienode import TrieNode
 
 UNKNOWN_VALUE = -99.0
@@ -68,27 +69,51 @@ class OneWordLexicalModel(BaseProbabilityModel):
 
 class ProbModel(BaseProbabilityModel):
     def __init__(self, orig_root: TrieNode, lambdas: list):
+        # A trie log-valószínűségeket tárol, hogy taggeléskor ne kelljen logaritmust számolni.
         self.root = self.create_root(orig_root, lambdas)
+        self.convert_to_log(self.root)
         super().__init__()
+        # Előre kiszámolt log-valószínűségek (csak egész elemű modellhez, pl. a tag átmenetekhez)
+        self.table = None
 
-    def prob(self, context: list, word) -> float:
+    def map(self, context: list, word) -> tuple:
         if self.element_mapper is not None:
             word = self.element_mapper.map(word)
         if self.context_mapper is not None:
             context = self.context_mapper.map_list(context)
-        node = self.root
+        return context, word
+
+    @staticmethod
+    def find_node(node: TrieNode, context: list, word) -> TrieNode:
+        # A leghosszabb olyan kontextus csúcsa, amelyik még tartalmazza a szót.
         for prev in context[::-1]:
-            find_more = prev in node.child_nodes.keys() and \
-                word in node.child_nodes[prev].words.keys()
-            if find_more:
-                node = node.child_nodes[prev]
+            child = node.child_nodes.get(prev)
+            if child is not None and word in child.words:
+                node = child
             else:
                 break
-        return node.words.get(word, 0.0)
+        return node
+
+    def prob(self, context: list, word) -> float:
+        log_prob = self.log_prob(context, word)
+        return math.exp(log_prob) if log_prob != UNKNOWN_VALUE else 0.0
 
     def log_prob(self, context: list, word) -> float:
-        prob = self.prob(context, word)
-        return math.log(prob) if prob > 0 else UNKNOWN_VALUE
+        if self.table is not None:
+            log_prob = self.table.log_prob(context, word)
+            if log_prob is not None:
+                return log_prob
+        context, word = self.map(context, word)
+        return self.find_node(self.root, context, word).words.get(word, UNKNOWN_VALUE)
+
+    def create_table(self, dense: bool=True):
+        self.table = LogProbTable(self.root, dense)
+
+    @staticmethod
+    def convert_to_log(node: TrieNode):
+        node.words = {k: math.log(v) if v > 0 else UNKNOWN_VALUE for k, v in node.words.items()}
+        for child in node.child_nodes.values():
+            ProbModel.convert_to_log(child)
 
     def create_root(self, node: TrieNode, lambdas: list) -> TrieNode:
         new_root = self.calc_probs(node)
@@ -119,3 +144,74 @@ class ProbModel(BaseProbabilityModel):
         new_root = TrieNode(node.id_, node_type=float)
         new_root.words = {word: node.apriori_prob(word) for word in node.words.keys()}
         return new_root
+
+
+class LogProbTable:
+    """The interpolated log-probabilities of a ProbModel with integer elements and contexts (the
+    tag transition model) for every context path of the trie, keyed by packed context IDs.
+    Dense rows are stored in one flat array. Sparse rows only hold the elements seen after the
+    context, the others are looked up in the row of the root, as the trie walk would do.
+    Contexts and elements out of the table (e.g. tags that must be mapped) are left to the trie.
+    """
+    DENSE = "dense"
+    SPARSE = "sparse"
+
+    def __init__(self, root: TrieNode, dense: bool=True):
+        self.dense = dense
+        self.width = self.max_id(root) + 1
+        self.base = self.width + 1  # A 0 számjegy hiányzik, így a különböző hosszúak sem ütköznek.
+        self.depth = 0
+        self.values = array("d")
+        self.rows = dict()           # {packed context -> offset (dense) vagy {elem -> float}}
+        self.root_row = self.new_row(array("d", [UNKNOWN_VALUE]) * self.width, root.words)
+        for child in root.child_nodes.values():
+            self.add_rows(child, dict(), 0, 1)
+
+    @staticmethod
+    def max_id(node: TrieNode) -> int:
+        return max([max(node.words.keys(), default=0)] +
+                   [max(child.id_, LogProbTable.max_id(child))
+                    for child in node.child_nodes.values()])
+
+    @staticmethod
+    def new_row(base_row: array, log_probs: dict) -> array:
+        row = array("d", base_row)
+        for k, v in log_probs.items():
+            row[k] = v
+        return row
+
+    def add_rows(self, node: TrieNode, path_words: dict, key: int, depth: int):
+        # A trie bejárás egy elemnél a legmélyebb olyan csúcsnál áll meg, amelyik tartalmazza.
+        # Mivel a gyerekek szavai a szülőéinek részhalmazai, ez a felülírásokkal összefésült sor.
+        key += (node.id_ + 1) * self.base ** (depth - 1)
+        self.depth = max(self.depth, depth)
+        path_words = dict(path_words)
+        path_words.update(node.words)
+        if self.dense:
+            self.rows[key] = len(self.values)
+            self.values.extend(self.new_row(self.root_row, path_words))
+        else:
+            self.rows[key] = path_words
+        for child in node.child_nodes.values():
+            self.add_rows(child, path_words, key, depth + 1)
+
+    def log_prob(self, context: list, word) -> float or None:
+        # None, ha a trie-ben kell keresni.
+        if not 0 <= word < self.width:
+            return None
+        keys = []
+        key = 0
+        power = 1
+        for tag in context[:-self.depth - 1:-1]:
+            if not 0 <= tag < self.width:
+                return None
+            key += (tag + 1) * power
+            power *= self.base
+            keys.append(key)
+        for key in reversed(keys):
+            row = self.rows.get(key)
+            if row is not None:
+                if self.dense:
+                    return self.values[row + word]
+                return row.get(word, self.root_row[word])
+        return self.root_row[word]
@@ -62,18 +62,67 @@ class RawModel:
         self.data = model_data
         self.raw_model_data = RawModelData(model_data.tagging_order, model_data.emission_order)
 
-    def train(self, document: Document):
-        # todo read lines by lines. See the issue:
-        # https://github.com/ppke-nlpg/purepos-python3/issues/5
+    def train(self, document: Document, lemma_mapper=None, jobs: int=1):
+        # A document.sentences()-en kétszer megy végig (a combiner paraméterbecslése is), a
+        # StreamedDocument-tel mindkétszer a fájlból olvasva (issue #5).
+        self.add_sentences(document.sentences(), lemma_mapper)
+        self.finish_training(document, jobs)
+
+    def add_sentences(self, sentences, lemma_mapper=None):
+        # A tanítás első menete: a számlálás. Párhuzamos tanításkor shardonként egy-egy modellbe,
+        # amiket utána a merge összevon (ld. Trainer).
+        self.data.tag_vocabulary.unfreeze()
         self.raw_model_data.eos_tag = self.data.tag_vocabulary.add_element(ModelData.EOS_TAG)
-        for sentence in document.sentences():
+        for sentence in sentences:
             mysentence = Sentence(sentence)
             self.add_sentence_markers(mysentence)
-            self.add_sentence(mysentence)
+            self.add_sentence(mysentence, lemma_mapper)
+
+    def finish_training(self, document: Document, jobs: int=1):
+        # A számlálás utáni lépések: suffix fák és a combiner paraméterei (a teljes korpuszon,
+        # jobs folyamatban).
+        self.build_suffix_trees()
+        self.raw_model_data.combiner.calculate_params(document, self.raw_model_data, self.data,
+                                                      jobs)
+
+    def merge(self, other):
+        """Add the counts of another raw model (eg. counted on another shard of the corpus with
+        add_sentences) to this one. The tag indices of the other model are mapped to this model's
+        vocabulary. Merging the shards of a corpus in order gives the same counts, tag indices
+        and orderings as counting the whole corpus in one pass. It must be done before
+        finish_training.
+        :param other: The other RawModel, with the same orders.
+        """
+        self.data.tag_vocabulary.unfreeze()
+        self.raw_model_data.eos_tag = self.data.tag_vocabulary.add_element(ModelData.EOS_TAG)
+        tag_map = self.data.tag_vocabulary.merge(other.data.tag_vocabulary)
+        self.data.standard_tokens_lexicon.merge(other.data.standard_tokens_lexicon, tag_map)
+        self.data.spec_tokens_lexicon.merge(other.data.spec_tokens_lexicon, tag_map)
+        self.raw_model_data.merge(other.raw_model_data, tag_map)
+
+    def merge_trained(self, others: list):
+        """Merge other trained raw models (eg. trained on other parts of a corpus) into this one.
+        The counts are summed and the suffix guessers are rebuilt, so the result is the same as
+        training on the concatenated corpora, except for the combiner parameters: estimating them
+        needs the corpus, so their average weighted by the token counts is used.
+        The suffix length and the rare frequency treshold of this model are kept.
+        :param others: RawModels with the same tag and emission orders.
+        """
+        for other in others:
+            if other.data.tagging_order != self.data.tagging_order or \
+                    other.data.emission_order != self.data.emission_order:
+                raise ValueError("Models with different tag or emission orders cannot be merged.")
+        for other in others:
+            tokens = self.raw_model_data.stat.tokens
+            self.merge(other)
+            self.raw_model_data.combiner.merge(other.raw_model_data.combiner, tokens,
+                                               other.raw_model_data.stat.tokens)
+        # A suffix fák a lexikonból újraépülnek, a guesser számlálók is.
+        self.raw_model_data.stat.l_guesser_items = 0
+        self.raw_model_data.stat.u_guesser_items = 0
         self.build_suffix_trees()
-        self.raw_model_data.combiner.calculate_params(document, self.raw_model_data, self.data)
 
-    def add_sentence(self, sentence: Sentence):
+    def add_sentence(self, sentence: Sentence, lemma_mapper=None):
         self.raw_model_data.stat.increment_sentence_count()
         tags = []
         # Visszafelé kell haladni a tag szótár felépítésekor
@@ -88,7 +137,7 @@ class RawModel:
         for i in range(len(sentence)-1, -1, -1):
             token = sentence[i]
             if token.token != ModelData.BOS_TOKEN:
-                token = util.simplify_lemma(token)
+                token = util.simplify_lemma(token, lemma_mapper)
             word = token.token
             lem = token.stem
             tagstr = token.tag
@@ -128,10 +177,15 @@ class RawModel:
                             lower_word, tag, word_tag_freq)
                         self.raw_model_data.stat.increment_upper_guesser_items(word_tag_freq)
 
-    def compile(self, conf: Configuration) -> CompiledModel:
+    def compile(self, conf: Configuration, transition_table: str=None,
+                precompute_guessers: bool=False) -> CompiledModel:
         # Create a CompiledModel from this RawModel
+        # transition_table: None, "dense" or "sparse" (see LogProbTable)
+        # precompute_guessers: store the smoothed suffix distributions (see HashSuffixGuesser)
         self.data.tag_vocabulary.store_max_element()
-        comp_model_data = self.raw_model_data.compile()
+        # Tagging közben a szótár nem bővülhet (ld. VocabularyOverlay).
+        self.data.tag_vocabulary.freeze()
+        comp_model_data = self.raw_model_data.compile(transition_table, precompute_guessers)
         comp_model_data.add_mappings(self.data.tag_vocabulary, conf.tag_mappings)
         return CompiledModel(comp_model_data, self.data)
 
@@ -30,6 +30,7 @@ from purepos.common.statistics import Statistics
 from purepos.model.suffixtree import HashSuffixTree
 from purepos.model.ngrammodel import NGramModel
 from purepos.model.lemmaunigrammodel import LemmaUnigramModel
+from purepos.model.probmodel import LogProbTable
 
 
 class RawModelData:
@@ -56,17 +57,42 @@ class RawModelData:
         from purepos.model.combiner import default_combiner
         self.combiner = default_combiner()
 
-    def compile(self) -> CompiledModelData:
+    def merge(self, other, tag_map: dict):
+        # Egy másik shard számlálóinak hozzáadása (a suffix fák előtt, ld. RawModel.merge).
+        # tag_map: a másik shard tag indexeiről ennek a modellnek az indexeire.
+        self.stat.merge(other.stat)
+        self.tag_ngram_model.merge(other.tag_ngram_model, tag_map, words_are_tags=True)
+        self.std_emission_ngram_model.merge(other.std_emission_ngram_model, tag_map)
+        self.spec_emission_ngram_model.merge(other.spec_emission_ngram_model, tag_map)
+        lemma_transfs = dict()
+
+        def map_lemma_transf(lemma_transf):
+            ret = lemma_transfs.get(lemma_transf)
+            if ret is None:
+                ret = lemma_transfs[lemma_transf] = lemma_transf.remap_tag(tag_map)
+            return ret
+
+        self.lemma_suffix_tree.merge(other.lemma_suffix_tree, map_lemma_transf)
+        self.lemma_freq_tree.merge(other.lemma_freq_tree)
+        self.lemma_unigram_model.merge(other.lemma_unigram_model)
+
+    def compile(self, transition_table: str=None, precompute_guessers: bool=False) \
+            -> CompiledModelData:
         c = CompiledModelData()
         c.unigram_lemma_model = self.lemma_unigram_model
         c.tag_transition_model = self.tag_ngram_model.create_probability_model()
+        if transition_table is not None:
+            # A tag átmenetek log-valószínűségei táblázatból, a trie csak a ritka esetekre marad.
+            c.tag_transition_model.create_table(transition_table == LogProbTable.DENSE)
         c.standard_emission_model = self.std_emission_ngram_model.create_probability_model()
         c.spec_tokens_emission_model = self.spec_emission_ngram_model.create_probability_model()
         c.apriori_tag_probs = self.tag_ngram_model.word_apriori_probs()
         theta = HashSuffixTree.calculate_theta(c.apriori_tag_probs)
-        c.lower_case_suffix_guesser = self.lower_suffix_tree.create_guesser(theta)
-        c.upper_case_suffix_guesser = self.upper_suffix_tree.create_guesser(theta)
-        c.lemma_guesser = self.lemma_suffix_tree.create_guesser(theta)
-        c.suffix_lemma_model = self.lemma_freq_tree.create_guesser(theta)
+        c.lower_case_suffix_guesser = self.lower_suffix_tree.create_guesser(theta,
+                                                                            precompute_guessers)
+        c.upper_case_suffix_guesser = self.upper_suffix_tree.create_guesser(theta,
+                                                                            precompute_guessers)
+        c.lemma_guesser = self.lemma_suffix_tree.create_guesser(theta, precompute_guessers)
+        c.suffix_lemma_model = self.lemma_freq_tree.create_guesser(theta, precompute_guessers)
         c.combiner = self.combiner
         return c
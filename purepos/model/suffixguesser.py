@@ -35,14 +35,83 @@ class HashSuffixGuesser:  # (BaseSuffixGuesser):
         m = max(probabilities.items(), key=lambda x: x[1])
         return m[0]
 
+    @staticmethod
+    def prune_tags(log_probs: dict, log_theta: float, max_tags: int) -> list:
+        # A legjobb tag-ek (tag, log-valószínűség) párjai csökkenő sorrendben: legfeljebb max_tags
+        # darab, a legjobbnál legfeljebb log_theta-val rosszabbak. „TnT – A Statistical
+        # Part-of-Speech Tagger” Brants, Thorsen 2000 2.3, 4)
+        if len(log_probs) == 0:
+            return []
+        min_val = log_probs[HashSuffixGuesser.max_probability_tag(log_probs)] - log_theta
+        ret = [(tag, val) for tag, val in log_probs.items() if val > min_val]
+        ret.sort(key=lambda ent: ent[1], reverse=True)
+        return ret[:max_tags]
+
     def __init__(self, freq_table: dict, theta: float):
         self.freq_table = freq_table
         self.theta = theta
         self.theta_plus_one = theta + 1
         self.mapper = None
         self.lemma_mapper = None
+        self.max_suffix_length = max((len(suffix) for suffix in freq_table.keys()), default=0)
+        # Előre kiszámolt eloszlások (ld. precompute): {suffix -> (log-valószínűségek dict-jei)}
+        self.log_chains = None
+        # Metszett eloszlások: {(suffix, log_theta, max_tags) -> [(tag, float)]}
+        self.pruned_tags = dict()
+
+    def precompute(self):
+        # Minden ismert suffixhez eltárolja a saját tag-jeinek végleges (simított) log-valószínűségét.
+        # Egy szó eloszlása megegyezik a leghosszabb ismert suffixéével, ez pedig a rövidebb ismert
+        # suffixek ilyen táblázatainak sorban egymásra írásával áll elő, számolás nélkül.
+        chains = dict()      # {suffix -> (valószínűségek dict-jei)}
+        self.log_chains = dict()
+        for suffix in sorted(self.freq_table.keys(), key=len):
+            # A leghosszabb valódi ismert suffix láncát folytatja.
+            chain, log_chain = (), ()
+            for i in range(1, len(suffix) + 1):
+                if suffix[i:] in self.freq_table:
+                    chain, log_chain = chains[suffix[i:]], self.log_chains[suffix[i:]]
+                    break
+            suffix_value = self.freq_table[suffix]
+            probs = dict()
+            for tag, val in suffix_value[0].items():
+                prev = 0.0
+                for parent_probs in reversed(chain):
+                    if tag in parent_probs:
+                        prev = parent_probs[tag]
+                        break
+                probs[tag] = (prev + (float(val) / suffix_value[1] * self.theta)) \
+                    / self.theta_plus_one
+            chains[suffix] = chain + (probs,)
+            self.log_chains[suffix] = log_chain + \
+                ({tag: math.log(v) if v > 0 else UNKNOWN_VALUE for tag, v in probs.items()},)
+
+    def longest_suffix(self, word) -> str or None:
+        # Egy szó eloszlása megegyezik a leghosszabb ismert suffixéével.
+        for i in range(max(0, len(word) - self.max_suffix_length), len(word) + 1):
+            if word[i:] in self.freq_table:
+                return word[i:]
+        return None
+
+    def longest_chain(self, word) -> tuple:
+        suffix = self.longest_suffix(word)
+        return self.log_chains[suffix] if suffix is not None else ()
+
+    def pruned_tag_log_probabilities(self, word, log_theta: float, max_tags: int) -> list:
+        # A prune_tags eredménye, suffixenként csak egyszer kiszámolva.
+        key = (self.longest_suffix(word), log_theta, max_tags)
+        ret = self.pruned_tags.get(key)
+        if ret is None:
+            ret = self.prune_tags(self.tag_log_probabilities(word), log_theta, max_tags)
+            self.pruned_tags[key] = ret
+        return ret
 
     def tag_log_probabilities(self, word) -> dict:
+        if self.log_chains is not None:
+            ret = dict()
+            for log_probs in self.longest_chain(word):
+                ret.update(log_probs)
+            return ret
         return {k: math.log(v) for k, v in self.tag_probabilities(word).items()}
 
     def tag_probabilities(self, word) -> dict:
@@ -55,6 +124,14 @@ class HashSuffixGuesser:  # (BaseSuffixGuesser):
         return mret
 
     def tag_log_probability(self, word, tag) -> float:
+        if self.log_chains is not None:
+            if self.mapper is not None:
+                tag = self.mapper.map(tag)
+            for log_probs in reversed(self.longest_chain(word)):
+                log_prob = log_probs.get(tag)
+                if log_prob is not None:
+                    return log_prob
+            return UNKNOWN_VALUE
         prob = self.tag_probability(word, tag)
         return math.log(prob) if prob > 0 else UNKNOWN_VALUE
 
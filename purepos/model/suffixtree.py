@@ -65,8 +65,19 @@ class HashSuffixTree:
         else:
             self.representation[suffix] = [{tag: cnt}, cnt]
 
-    def create_guesser(self, theta: float) -> HashSuffixGuesser:
-        return HashSuffixGuesser(self.representation, theta)
+    def merge(self, other, map_tag=None):
+        # A másik fa számlálóinak hozzáadása. map_tag: a másik fa tag-jeit (kulcsait) erre a fára
+        # képező függvény, ha más tag-szótárral számolták.
+        for suffix, value in other.representation.items():
+            for tag, count in value[0].items():
+                self.increment(suffix, tag if map_tag is None else map_tag(tag), count)
+        self.total_tag_count += other.total_tag_count
+
+    def create_guesser(self, theta: float, precompute: bool=False) -> HashSuffixGuesser:
+        guesser = HashSuffixGuesser(self.representation, theta)
+        if precompute:
+            guesser.precompute()
+        return guesser
 
 
 # class HashLemmaTree(HashSuffixTree):
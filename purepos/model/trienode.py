@@ -58,6 +58,17 @@ class TrieNode:
             return child_node
         return self.child_nodes[child]
 
+    def merge(self, other, id_map: dict, word_map: dict=None):
+        # A másik (másik tag-szótárral számolt) trie számlálóinak hozzáadása. id_map: a másik trie
+        # csúcsazonosítóiról (tag-ek) ennek a szótárára, word_map ugyanez a szavakra (ha tag-ek).
+        for word, num in other.words.items():
+            if word_map is not None:
+                word = word_map[word]
+            self.words[word] = self.words.get(word, self.zero()) + num
+        self.num += other.num
+        for child_id, child in other.child_nodes.items():
+            self.add_child(id_map[child_id]).merge(child, id_map, word_map)
+
     def apriori_prob(self, word) -> float:
         if word in self.words.keys():
             return self.words[word] / self.num
@@ -25,8 +25,14 @@
 
 __author__ = 'morta@digitus.itk.ppke.hu'
 
+import contextvars
 from purepos.model.ngram import NGram
 
+# A lefagyasztott (lefordított modellbeli) szótárba nem kerülhet új elem, a tagging közben
+# felbukkanó ismeretlen tag-ek a kérés saját VocabularyOverlay-ébe kerülnek. Az aktív overlay
+# szálanként és asyncio taszkonként külön van.
+active_overlay = contextvars.ContextVar("active_overlay", default=None)
+
 
 class BiDict(dict):
     def __init__(self, *args, **kwargs):
@@ -67,6 +73,17 @@ class Lexicon:
             self.representation[token] = {tag: 1}
         self.size += 1
 
+    def merge(self, other, tag_map: dict):
+        # A másik lexikon számlálóinak hozzáadása, a tag-ek tag_map szerint átszámozva.
+        for token, other_tags in other.representation.items():
+            value = self.representation.get(token)
+            if value is None:
+                value = self.representation[token] = dict()
+            for tag, count in other_tags.items():
+                tag = tag_map[tag]
+                value[tag] = value.get(tag, 0) + count
+        self.size += other.size
+
     def tags(self, word) -> set:
         return set(self.representation.get(word, {}).keys())
 
@@ -82,6 +99,8 @@ class Lexicon:
 
 
 class BaseVocabulary:
+    frozen = False  # Osztályszinten, mert a régi modellfájlokban nincs ilyen attribútum.
+
     def __init__(self):
         self.voc = BiDict()
         self.max_known_index = None
@@ -90,10 +109,20 @@ class BaseVocabulary:
         return len(self.voc)
 
     def index(self, word):
-        return self.voc.get(word)
+        ret = self.voc.get(word)
+        if ret is None and self.frozen:
+            overlay = active_overlay.get()
+            if overlay is not None and overlay.vocabulary is self:
+                return overlay.extra.get(word)
+        return ret
 
     def word(self, index):
-        return self.voc.inverse.get(index)
+        ret = self.voc.inverse.get(index)
+        if ret is None and self.frozen:
+            overlay = active_overlay.get()
+            if overlay is not None and overlay.vocabulary is self:
+                return overlay.extra.inverse.get(index)
+        return ret
 
     def indices(self, wlist: list):
         try:
@@ -106,10 +135,28 @@ class BaseVocabulary:
         # DefaultBiDict?
         if element in self.voc.keys():
             return self.voc[element]
+        elif self.frozen:
+            overlay = active_overlay.get()
+            if overlay is None or overlay.vocabulary is not self:
+                raise KeyError("The vocabulary is frozen, '{}' can only be added to a "
+                               "VocabularyOverlay.".format(element))
+            return overlay.add_element(element)
         else:
             self.voc[element] = len(self.voc)
             return self.voc[element]
 
+    def merge(self, other) -> dict:
+        # A másik szótár elemeinek hozzáadása az ő indexeik sorrendjében. Az eredmény a másik
+        # szótár indexeiről ennek az indexeire képez.
+        return {index: self.add_element(element) for element, index in other.voc.items()}
+
+    def freeze(self):
+        # A lefordított modell szótára (ld. RawModel.compile).
+        self.frozen = True
+
+    def unfreeze(self):
+        self.frozen = False
+
     def __str__(self):
         return self.voc.__str__()
 
@@ -130,3 +177,31 @@ class IntVocabulary(BaseVocabulary):
 
     def store_max_element(self):
         self.max_known_index = len(self.voc) - 1
+
+
+class VocabularyOverlay:
+    """Per-request extension of a frozen vocabulary. Elements unknown to the model get indices
+    after the indices of the vocabulary, and they are forgotten with the overlay. While the
+    overlay is active (with statement), the vocabulary itself resolves these elements.
+    """
+    def __init__(self, vocabulary: BaseVocabulary):
+        self.vocabulary = vocabulary
+        self.extra = BiDict()
+        self.token = None
+
+    def add_element(self, element):
+        ret = self.vocabulary.voc.get(element)
+        if ret is None:
+            ret = self.extra.get(element)
+            if ret is None:
+                ret = len(self.vocabulary.voc) + len(self.extra)
+                self.extra[element] = ret
+        return ret
+
+    def __enter__(self):
+        self.token = active_overlay.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        active_overlay.reset(self.token)
+        self.token = None
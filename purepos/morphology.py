@@ -25,9 +25,17 @@
 
 __author__ = 'morta@digitus.itk.ppke.hu'
 
+import collections
+import contextvars
+import threading
+import time
 from io import TextIOWrapper
 from docmodel.token import Token
 
+# Az éppen címkézett kérés szavainak elemzései (ld. SentenceAnalysis). Szálanként és asyncio
+# taszkonként külön.
+active_sentence_analysis = contextvars.ContextVar("active_sentence_analysis", default=None)
+
 
 class BaseMorphologicalAnalyser:
     def tags(self, word: str) -> list:
@@ -36,13 +44,32 @@ class BaseMorphologicalAnalyser:
     def analyse(self, word: str) -> list:
         return []  # eredetileg None
 
+    def tags_and_analyses(self, word: str) -> tuple:
+        # A tags és az analyse eredménye együtt. Ahol lehet, egyetlen elemzésből.
+        return self.tags(word), self.analyse(word)
+
+    def analyse_many(self, words: list) -> list:
+        # A szavak tags_and_analyses eredményei, minden szóalakot csak egyszer elemez.
+        anals = dict.fromkeys(words)
+        for word in anals:
+            anals[word] = self.tags_and_analyses(word)
+        return [anals[word] for word in words]
+
+    def counters(self) -> collections.Counter:
+        # A cache-elő elemzők statisztikája (ld. CachingAnalyser), párhuzamos címkézéskor a
+        # munkafolyamatokból összegyűjtve.
+        return collections.Counter()
+
+    def add_counters(self, counters: collections.Counter):
+        pass
+
 
 class MorphologicalTable(BaseMorphologicalAnalyser):
     def __init__(self, file: TextIOWrapper):
         self.morph_file = file
         self.morph_table = dict()
         for line in file:
-            cells = line.split("\t")
+            cells = line.rstrip("\n").split("\t")
             if len(cells) > 0:
                 token = cells[0]
                 anals = cells[1:]
@@ -68,3 +95,149 @@ class HumorAnalyser(BaseMorphologicalAnalyser):
 
     def analyse(self, word: str) -> list:
         return [Token(word, anal[0], anal[1]) for anal in self.humor.analyze(word)]
+
+    def tags_and_analyses(self, word: str) -> tuple:
+        anals = self.humor.analyze(word)
+        return [anal[1] for anal in anals], [Token(word, anal[0], anal[1]) for anal in anals]
+
+
+class CachingAnalyser(BaseMorphologicalAnalyser):
+    """Keeps the tags_and_analyses results of the wrapped analyser for the last cache_size word
+    forms (LRU). It can be shared by threads. The returned lists must not be modified.
+    """
+    DEFAULT_CACHE_SIZE = 100000
+
+    def __init__(self, analyser: BaseMorphologicalAnalyser, cache_size: int=DEFAULT_CACHE_SIZE):
+        self.analyser = analyser
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.lookups = 0
+        self.misses = 0
+        self.analyser_time = 0.0  # sec
+
+    def tags_and_analyses(self, word: str) -> tuple:
+        with self.lock:
+            self.lookups += 1
+            ret = self.cache.get(word)
+            if ret is not None:
+                self.cache.move_to_end(word)
+                return ret
+        start = time.perf_counter()
+        ret = self.analyser.tags_and_analyses(word)
+        self.store([word], [ret], time.perf_counter() - start)
+        return ret
+
+    def analyse_many(self, words: list) -> list:
+        # A hiányzó szóalakokat ismétlődés nélkül, egyetlen hívással kéri az elemzőtől.
+        found = dict()
+        missing = []
+        with self.lock:
+            self.lookups += len(words)
+            for word in words:
+                if word not in found:
+                    ret = self.cache.get(word)
+                    if ret is not None:
+                        self.cache.move_to_end(word)
+                    else:
+                        missing.append(word)
+                    found[word] = ret
+        if len(missing) > 0:
+            start = time.perf_counter()
+            anals = self.analyser.analyse_many(missing)
+            self.store(missing, anals, time.perf_counter() - start)
+            found.update(zip(missing, anals))
+        return [found[word] for word in words]
+
+    def store(self, words: list, anals: list, elapsed: float):
+        with self.lock:
+            self.misses += len(words)
+            self.analyser_time += elapsed
+            for word, ret in zip(words, anals):
+                self.cache[word] = ret
+                self.cache.move_to_end(word)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def tags(self, word: str) -> list:
+        return self.tags_and_analyses(word)[0]
+
+    def analyse(self, word: str) -> list:
+        return self.tags_and_analyses(word)[1]
+
+    def counters(self) -> collections.Counter:
+        with self.lock:
+            return collections.Counter(lookups=self.lookups, misses=self.misses,
+                                       analyser_time=self.analyser_time)
+
+    def add_counters(self, counters: collections.Counter):
+        with self.lock:
+            self.lookups += counters["lookups"]
+            self.misses += counters["misses"]
+            self.analyser_time += counters["analyser_time"]
+
+    def stat(self) -> str:
+        hit_rate = 1 - self.misses / self.lookups if self.lookups > 0 else 0.0
+        return "Analyser cache: {} lookups, {:.2%} hit rate, {} word forms analysed in {:.3f} " \
+               "s.".format(self.lookups, hit_rate, self.misses, self.analyser_time)
+
+
+class SentenceAnalysis:
+    """The analyses of the words of one tagging request. While it is active (with statement),
+    SharedAnalyser analyses each word only once.
+    """
+    def __init__(self):
+        self.anals = dict()
+        self.token = None
+
+    def __enter__(self):
+        self.token = active_sentence_analysis.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        active_sentence_analysis.reset(self.token)
+        self.token = None
+
+
+class SharedAnalyser(BaseMorphologicalAnalyser):
+    """Shares the result of the wrapped analyser between the decoder (tags) and the lemmatizer
+    (analyse): within a SentenceAnalysis both are derived from one tags_and_analyses call.
+    """
+    def __init__(self, analyser: BaseMorphologicalAnalyser):
+        self.analyser = analyser
+
+    def tags_and_analyses(self, word: str) -> tuple:
+        sentence_analysis = active_sentence_analysis.get()
+        if sentence_analysis is None:
+            return self.analyser.tags_and_analyses(word)
+        ret = sentence_analysis.anals.get(word)
+        if ret is None:
+            ret = self.analyser.tags_and_analyses(word)
+            sentence_analysis.anals[word] = ret
+        return ret
+
+    def analyse_many(self, words: list) -> list:
+        sentence_analysis = active_sentence_analysis.get()
+        if sentence_analysis is None:
+            return self.analyser.analyse_many(words)
+        anals = sentence_analysis.anals
+        missing = [word for word in dict.fromkeys(words) if word not in anals]
+        if len(missing) > 0:
+            anals.update(zip(missing, self.analyser.analyse_many(missing)))
+        return [anals[word] for word in words]
+
+    def counters(self) -> collections.Counter:
+        return self.analyser.counters()
+
+    def add_counters(self, counters: collections.Counter):
+        self.analyser.add_counters(counters)
+
+    def tags(self, word: str) -> list:
+        if active_sentence_analysis.get() is None:
+            return self.analyser.tags(word)
+        return self.tags_and_analyses(word)[0]
+
+    def analyse(self, word: str) -> list:
+        if active_sentence_analysis.get() is None:
+            return self.analyser.analyse(word)
+        return self.tags_and_analyses(word)[1]
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8, vim: expandtab:ts=4 -*-
+###############################################################################
+# Copyright (c) 2015 Móréh, Tamás
+# All rights reserved. This program and the accompanying materials
+# are made available under the terms of the GNU Lesser Public License v3
+# which accompanies this distribution, and is available at
+# http://www.gnu.org/licenses/
+#
+# This file is part of PurePos-Python3.
+#
+# PurePos-Python3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PurePos-Python3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser Public License for more details.
+#
+# Contributors:
+#     Móréh, Tamás - initial API and implementation
+##############################################################################
+
+__author__ = 'morta@digitus.itk.ppke.hu'
+
+import errno
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+import time
+from concurrent.futures import Future
+from purepos.tagger import POSTagger
+
+
+class RequestBatcher:
+    """Collects the sentences of concurrent requests and tags them in small batches with a single
+    tagger. Only the batcher thread touches the tagger (it is not thread-safe). The result of a
+    sentence does not depend on the other sentences of its batch (see POSTagger.tag_batch).
+    """
+    DEFAULT_MAX_BATCH = 32
+    DEFAULT_MAX_DELAY = 0.005  # sec
+
+    def __init__(self, tagger: POSTagger, max_batch: int=DEFAULT_MAX_BATCH,
+                 max_delay: float=DEFAULT_MAX_DELAY):
+        self.tagger = tagger
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, sentence: list, max_res: int) -> Future:
+        future = Future()
+        self.requests.put((sentence, max_res, future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            # Az első kérés után legfeljebb max_delay ideig várunk a többire.
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self.tag_batch(batch)
+
+    def tag_batch(self, batch: list):
+        # A max_res kérésenként eltérhet: azonosak együtt.
+        groups = dict()
+        for request in batch:
+            groups.setdefault(request[1], []).append(request)
+        for max_res, requests in groups.items():
+            try:
+                results = self.tagger.tag_batch([r[0] for r in requests], max_res)
+            except Exception as e:
+                for r in requests:
+                    r[2].set_exception(e)
+            else:
+                for r, result in zip(requests, results):
+                    r[2].set_result(result)
+
+
+class TaggingRequestHandler(socketserver.StreamRequestHandler):
+    # Soronként egy kérés. Sima szöveges sor: egy szóközökkel tokenizált mondat, a válasz a tag
+    # parancs kimenetével egyező sor. JSON objektum sor ({"tokens": [...]} vagy {"text": "...",
+    # és opcionálisan "max_results": n}): a válasz JSON. Ami nem érvényes JSON objektum (pl. egy
+    # "{" tokennel kezdődő mondat), az sima szöveges sor.
+    def handle(self):
+        for raw_line in self.rfile:
+            line = raw_line.decode(self.server.encoding).strip()
+            request = self.parse_json(line)
+            if request is not None:
+                response = self.handle_json(request)
+            else:
+                response = self.handle_line(line)
+            self.wfile.write((response + "\n").encode(self.server.encoding))
+            self.wfile.flush()
+
+    def handle_line(self, line: str) -> str:
+        # Hiba esetén egy "ERROR: ..." sor a válasz (a kapcsolat megmarad).
+        if line == "":
+            return ""
+        max_res = self.server.max_results
+        try:
+            result = self.server.batcher.submit(line.split(), max_res).result()
+            return self.server.tagger.sentences_to_string(result, max_res > 1)
+        except Exception as e:
+            return "ERROR: {}".format(e)
+
+    @staticmethod
+    def parse_json(line: str) -> dict or None:
+        if not line.startswith("{"):
+            return None
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return None
+        return request if isinstance(request, dict) else None
+
+    def handle_json(self, request: dict) -> str:
+        try:
+            if "tokens" in request:
+                sentence = request["tokens"]
+                if not isinstance(sentence, list) or \
+                        not all(isinstance(token, str) for token in sentence):
+                    raise ValueError('"tokens" must be a list of strings.')
+            else:
+                if not isinstance(request.get("text"), str):
+                    raise ValueError('"text" (a string) or "tokens" is required.')
+                sentence = request["text"].split()
+            max_res = int(request.get("max_results", self.server.max_results))
+            result = []
+            if len(sentence) > 0:
+                result = self.server.batcher.submit(sentence, max_res).result()
+            return json.dumps({"results": [{"tokens": [[t.token, t.stem, t.tag] for t in sent],
+                                            "score": sent.score} for sent in result]},
+                              ensure_ascii=False)
+        except Exception as e:
+            return json.dumps({"error": str(e)}, ensure_ascii=False)
+
+
+class TaggingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple, tagger: POSTagger, max_results: int=1,
+                 max_batch: int=RequestBatcher.DEFAULT_MAX_BATCH,
+                 max_delay: float=RequestBatcher.DEFAULT_MAX_DELAY, encoding: str="utf-8"):
+        """A TCP server which keeps the compiled model in memory and tags the sentences of the
+        concurrent connections in small batches.
+
+        :param address: (host, port) pair.
+        :param tagger: The tagger used for every request.
+        :param max_results: The default number of tag sequences for each sentence.
+        :param max_batch: The maximum number of sentences tagged together.
+        :param max_delay: Maximum time in seconds to wait for other requests to fill a batch.
+        :param encoding: The encoding of the requests and the responses.
+        """
+        super().__init__(address, TaggingRequestHandler)
+        self.tagger = tagger
+        self.max_results = max_results
+        self.encoding = encoding
+        self.batcher = RequestBatcher(tagger, max_batch, max_delay)
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixTaggingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self, path: str, tagger: POSTagger, max_results: int=1,
+                     max_batch: int=RequestBatcher.DEFAULT_MAX_BATCH,
+                     max_delay: float=RequestBatcher.DEFAULT_MAX_DELAY, encoding: str="utf-8"):
+            """The same as TaggingServer, but it listens on a Unix domain socket. A stale socket
+            file (eg. left by a killed server) is removed before binding, and the socket file is
+            removed when the server is closed. If another server listens on the path, OSError
+            (EADDRINUSE) is raised.
+
+            :param path: Path of the socket file.
+            """
+            if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+                self.remove_stale_socket(path)
+            self.socket_file = None  # A saját socket fájl, ha a bind sikerült.
+            super().__init__(path, TaggingRequestHandler)
+            self.tagger = tagger
+            self.max_results = max_results
+            self.encoding = encoding
+            self.batcher = RequestBatcher(tagger, max_batch, max_delay)
+
+        @staticmethod
+        def remove_stale_socket(path: str):
+            # Csak akkor törli, ha senki nem figyel rajta (a kapcsolódás visszautasítva).
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except ConnectionRefusedError:
+                os.unlink(path)
+            else:
+                raise OSError(errno.EADDRINUSE, "Another server is listening on {}".format(path))
+            finally:
+                probe.close()
+
+        def server_bind(self):
+            super().server_bind()
+            self.socket_file = self.server_address
+
+        def server_close(self):
+            super().server_close()
+            if self.socket_file is not None:
+                try:
+                    os.unlink(self.socket_file)
+                except FileNotFoundError:
+                    pass
+                self.socket_file = None
+else:
+    UnixTaggingServer = None
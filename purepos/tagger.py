@@ -26,6 +26,10 @@
 __author__ = 'morta@digitus.itk.ppke.hu'
 
 import io
+import collections
+import contextlib
+import functools
+import multiprocessing
 from docmodel.containers import Sentence
 from docmodel.token import Token, ModToken
 from purepos.common import util
@@ -34,14 +38,29 @@ from purepos.common.lemma import batch_convert
 from purepos.common.lemmatransformation import def_lemma_representation_by_token
 from purepos.model.compiledmodel import CompiledModel, CompiledModelData
 from purepos.model.modeldata import ModelData
-from purepos.morphology import BaseMorphologicalAnalyser
+from purepos.model.vocabulary import VocabularyOverlay
+from purepos.morphology import BaseMorphologicalAnalyser, SentenceAnalysis, SharedAnalyser
 from purepos.decoder.basedecoder import BeamSearch, BeamedViterbi
+from purepos.decoder.vectorizeddecoder import VectorizedViterbi
+
+
+# A párhuzamos címkézés munkafolyamatai a forkkal öröklik (ld. POSTagger.tag_parallel).
+_worker_tagger = None
+
+
+def _tag_chunk(lines: list, max_res_num: int, batch_size: int) -> tuple:
+    # A formázott sorok és az elemző statisztikájának növekménye (ld. tag_parallel).
+    counters = _worker_tagger.analyser.counters()
+    ret = _worker_tagger.tag_chunk(lines, max_res_num, batch_size)
+    return ret, _worker_tagger.analyser.counters() - counters
 
 
 class LemmaComparator:
-    def __init__(self, compilde_model_data: CompiledModelData, model_data: ModelData):
+    def __init__(self, compilde_model_data: CompiledModelData, model_data: ModelData,
+                 weight: float=None):
         self.comp_model_data = compilde_model_data
         self.model_data = model_data
+        self.weight = weight  # A konfigurációban megadott súly (ld. LogLinearBiCombiner)
 
     # def compare(self, t1: tuple, t2: tuple):
     #     # Java comparable interfész. E helyett itt callable.
@@ -57,53 +76,215 @@ class LemmaComparator:
 
     def __call__(self, pair):
         return self.comp_model_data.combiner.combine(pair[0], pair[1],
-                                                     self.comp_model_data, self.model_data)
+                                                     self.comp_model_data, self.model_data,
+                                                     self.weight)
 
+    def best(self, pairs: list, suffix_log_probs: dict) -> tuple:
+        # A legjobb (token, lemmatranszformáció) pár (azonos pontszámnál az első), a szó közös
+        # lemma-szuffix eloszlásával (ld. BaseCombiner.combine_all).
+        scores = self.comp_model_data.combiner.combine_all(pairs, suffix_log_probs,
+                                                            self.comp_model_data, self.model_data,
+                                                            self.weight)
+        return pairs[max(range(len(pairs)), key=scores.__getitem__)]
 
 
 class POSTagger:
-    @staticmethod
-    def preprocess_sentence(sentence: list):
-        util.analysis_queue.init(len(sentence))
+    DEFAULT_BATCH_SIZE = 64
+    PARALLEL_CHUNK_SIZE = 256
+
+    def preprocess_sentence(self, sentence: list) -> tuple:
+        # A mondat szavai és a felhasználó által megadott elemzések (None, ha nincsenek).
+        user_anals = self.context.new_analysis_queue()
+        user_anals.init(len(sentence))
         ret = []
         for i, word in enumerate(sentence):
-            if AnalysisQueue.ispreanalysed(word):
-                util.analysis_queue.add_word(word, i)
-                ret.append(AnalysisQueue.clean(word))
+            if user_anals.ispreanalysed(word):
+                user_anals.add_word(word, i)
+                ret.append(user_anals.clean(word))
             else:
                 ret.append(word)
-        return ret
+        return ret, user_anals
 
     def __init__(self, model: CompiledModel,
                  analyser: BaseMorphologicalAnalyser,
                  log_theta: float,
                  suf_theta: float,
                  max_guessed_tags: int,
-                 use_beam_search: bool):
+                 use_beam_search: bool,
+                 use_vectorized: bool=False,
+                 beam_width: int=None,
+                 context: util.Context=None):
         self.model = model
         self.analyser = analyser
+        # A futásonkénti beállítások (konfiguráció, elválasztók, színek).
+        self.context = context if context is not None else util.Context()
         if use_beam_search:
-            # todo esetleg beam_size a parancssorból?
-            self.decoder = BeamSearch(model, analyser, log_theta, suf_theta, max_guessed_tags)
+            self.decoder = BeamSearch(model, analyser, log_theta, suf_theta, max_guessed_tags,
+                                      beam_width)
+        elif use_vectorized:
+            self.decoder = VectorizedViterbi(model, analyser, log_theta, suf_theta,
+                                             max_guessed_tags, beam_width)
         else:
-            self.decoder = BeamedViterbi(model, analyser, log_theta, suf_theta, max_guessed_tags)
+            self.decoder = BeamedViterbi(model, analyser, log_theta, suf_theta, max_guessed_tags,
+                                         beam_width)
+
+    @contextlib.contextmanager
+    def request_scope(self, sentences: list=()):
+        # A kérés végéig élő állapot: a modell által nem ismert tag-ek.
+        with VocabularyOverlay(self.model.data.tag_vocabulary):
+            yield
 
     def tag_sentence(self, sentence: list,  # list of strings
                      max_res: int) -> Sentence:
-        sentence = self.preprocess_sentence(sentence)
-        tag_list = self.decoder.decode(sentence, max_res)
-        return [Sentence(self.merge(sentence, tags[0]), score=tags[1]) for tags in tag_list]
+        with self.request_scope():
+            sentence, user_anals = self.preprocess_sentence(sentence)
+            tag_list = self.decoder.decode(sentence, max_res, user_anals)
+            return [Sentence(self.merge(sentence, tags[0], user_anals), score=tags[1])
+                    for tags in tag_list]
+
+    def tag_sentences(self, sentences,  # iterable of lists of strings
+                      max_res: int=1,
+                      batch_size: int=DEFAULT_BATCH_SIZE) -> list:
+        """Tag many sentences at once. The sentences are read in batches of batch_size, and the
+        decoder decodes every batch together (the vectorized one in lockstep).
 
-    def merge(self, sentence: list, tags: list) -> list:
+        :param sentences: Iterable of sentences, each one is a list of words.
+        :param max_res: The maximum number of tag sequences for each sentence.
+        :param batch_size: The number of sentences decoded together.
+        :return: The results of tag_sentence for every sentence in the input order.
+        """
+        ret = []
+        batch = []
+        for sentence in sentences:
+            batch.append(sentence)
+            if len(batch) >= batch_size:
+                ret.extend(self.tag_batch(batch, max_res))
+                batch = []
+        if len(batch) > 0:
+            ret.extend(self.tag_batch(batch, max_res))
+        return ret
+
+    def tag_batch(self, sentences: list, max_res: int) -> list:
+        ret = [None for _ in sentences]
+        plain_ids = []
+        anal_parser = self.context.new_analysis_queue()
+        for i, sentence in enumerate(sentences):
+            # Az elemzett szavakat tartalmazó mondatok egyenként (a saját AnalysisQueue-jukkal).
+            if any(anal_parser.ispreanalysed(word) for word in sentence):
+                ret[i] = self.tag_sentence(sentence, max_res)
+            else:
+                plain_ids.append(i)
+        plain_sentences = [sentences[i] for i in plain_ids]
+        with self.request_scope(plain_sentences):
+            # A modell által nem ismert tag-ek overlay indexei az első előfordulás sorrendjében
+            # jönnek, ami a holtversenyeket eldöntheti: az ilyen tag-et használó mondatok saját
+            # overlay-jel, egyenként, hogy az eredményük ne függjön a köteg többi mondatától.
+            shared_ids = [i for i in plain_ids if not self.uses_unknown_tags(sentences[i])]
+            tag_lists = self.decoder.decode_batch([sentences[i] for i in shared_ids], max_res)
+            for i, tag_list in zip(shared_ids, tag_lists):
+                ret[i] = [Sentence(self.merge(sentences[i], tags[0]), score=tags[1])
+                          for tags in tag_list]
+            for i in plain_ids:
+                if ret[i] is None:
+                    with VocabularyOverlay(self.model.data.tag_vocabulary):
+                        ret[i] = [Sentence(self.merge(sentences[i], tags[0]), score=tags[1])
+                                  for tags in self.decoder.decode(sentences[i], max_res)]
+        return ret
+
+    def uses_unknown_tags(self, sentence: list) -> bool:
+        # Van-e a mondat szavainak elemzései között a modell által nem ismert tag (ld.
+        # BaseDecoder.classify_word, az eredménye cache-elt).
+        return any(type(tag) is str for i, word in enumerate(sentence)
+                   for tag in self.decoder.word_classes(word, i == 0)[5])
+
+    def merge(self, sentence: list, tags: list, user_anals: AnalysisQueue=None) -> list:
         vocab = self.model.data.tag_vocabulary
         return [Token(sentence[idx], None, vocab.word(tags[idx]))
                 for idx in range(min(len(tags), len(sentence)))]
 
-    def tag(self, source: io.TextIOWrapper, dest: io.TextIOWrapper, max_results_number: int=1):
-        for line in source:
-            sent_str = self.tag_and_format(line, max_results_number)
+    def tag(self, source: io.TextIOWrapper, dest: io.TextIOWrapper, max_results_number: int=1,
+            batch_size: int=1, jobs: int=1):
+        if jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+            self.tag_parallel(source, dest, max_results_number, batch_size, jobs)
+        elif batch_size > 1:
+            lines = []
+            for line in source:
+                lines.append(line)
+                if len(lines) >= batch_size:
+                    self.tag_lines(lines, dest, max_results_number)
+                    lines = []
+            self.tag_lines(lines, dest, max_results_number)
+        else:
+            for line in source:
+                sent_str = self.tag_and_format(line, max_results_number)
+                print(sent_str, file=dest)
+
+    def tag_parallel(self, source: io.TextIOWrapper, dest: io.TextIOWrapper, max_res_num: int,
+                     batch_size: int, jobs: int, chunk_size: int=PARALLEL_CHUNK_SIZE):
+        """Tag the input with jobs worker processes. The workers are forked after the model is
+        compiled, so they share it copy-on-write. The input is sent to them in chunks of
+        chunk_size lines and the output is written in the input order. The analyser statistics
+        of the workers (see CachingAnalyser) are added to this tagger's analyser.
+
+        :param jobs: The number of worker processes.
+        :param chunk_size: The number of lines sent to a worker at once.
+        """
+        global _worker_tagger
+        _worker_tagger = self
+        max_pending = 2 * jobs  # A sorrendező puffer mérete (a memóriát korlátozza).
+        pending = collections.deque()
+        try:
+            with multiprocessing.get_context("fork").Pool(jobs) as pool:
+                lines = []
+                for line in source:
+                    lines.append(line)
+                    if len(lines) >= chunk_size:
+                        pending.append(pool.apply_async(_tag_chunk,
+                                                        (lines, max_res_num, batch_size)))
+                        lines = []
+                        while len(pending) >= max_pending:
+                            self.write_chunk(pending.popleft().get(), dest)
+                if len(lines) > 0:
+                    pending.append(pool.apply_async(_tag_chunk, (lines, max_res_num, batch_size)))
+                while len(pending) > 0:
+                    self.write_chunk(pending.popleft().get(), dest)
+        finally:
+            _worker_tagger = None
+
+    def tag_chunk(self, lines: list, max_res_num: int, batch_size: int) -> list:
+        # A sorok címkézett, formázott alakja (egy munkafolyamat feladata).
+        if batch_size > 1:
+            ret = []
+            for i in range(0, len(lines), batch_size):
+                ret.extend(self.format_lines(lines[i:i + batch_size], max_res_num))
+            return ret
+        return [self.tag_and_format(line, max_res_num) for line in lines]
+
+    def write_chunk(self, result: tuple, dest: io.TextIOWrapper):
+        # Egy munkafolyamat eredménye: a sorok kiírása, az elemző statisztikájának gyűjtése.
+        sent_strs, counters = result
+        self.write_lines(sent_strs, dest)
+        self.analyser.add_counters(counters)
+
+    @staticmethod
+    def write_lines(sent_strs: list, dest: io.TextIOWrapper):
+        for sent_str in sent_strs:
             print(sent_str, file=dest)
 
+    def tag_lines(self, lines: list, dest: io.TextIOWrapper, max_res_num: int):
+        self.write_lines(self.format_lines(lines, max_res_num), dest)
+
+    def format_lines(self, lines: list, max_res_num: int) -> list:
+        sentences = [line.split() for line in lines if line.strip() != ""]
+        results = iter(self.tag_batch(sentences, max_res_num))
+        ret = []
+        for line in lines:
+            sent_str = ""
+            if line.strip() != "":
+                sent_str = self.sentences_to_string(next(results), max_res_num > 1)
+            ret.append(sent_str)
+        return ret
+
     def tag_and_format(self, line: str, max_res_num: int) -> str:
         sent_str = ""
         if line.strip() != "":
@@ -114,49 +295,83 @@ class POSTagger:
     def sentences_to_string(self, sentences: list, show_prob: bool) -> str:
         return "\t".join([self.sent_to_string(s, show_prob) for s in sentences])
 
-    @staticmethod
-    def sent_to_string(sentence: Sentence, show_prob: bool) -> str:
+    def sent_to_string(self, sentence: Sentence, show_prob: bool) -> str:
         # ret = " ".join(str(sentence))
-        ret = str(sentence)
+        ret = sentence.to_string(self.context.separator, self.context.colors)
         if show_prob:
             ret += "$${}$$".format(sentence.score)
         return ret
 
 
 class MorphTagger(POSTagger):
+    DEFAULT_LEMMA_CACHE_SIZE = 65536
+
     def __init__(self, model: CompiledModel,
                  analyser: BaseMorphologicalAnalyser,
                  log_theta: float,
                  suf_theta: float,
                  max_guessed_tags: int,
-                 use_beam_search: bool):
-        super().__init__(model, analyser, log_theta, suf_theta, max_guessed_tags, use_beam_search)
-        self.lemma_comparator = LemmaComparator(model.compiled_data, model.data)
+                 use_beam_search: bool,
+                 use_vectorized: bool=False,
+                 beam_width: int=None,
+                 context: util.Context=None,
+                 lemma_cache_size: int=DEFAULT_LEMMA_CACHE_SIZE):
+        # A dekóder (tags) és a lemmatizáló (analyse) kérésenként egyszer elemez egy szót.
+        super().__init__(model, SharedAnalyser(analyser), log_theta, suf_theta, max_guessed_tags,
+                         use_beam_search, use_vectorized, beam_width, context)
+        self.lemma_comparator = None
         self.stem_filter = util.StemFilter.create_stem_filter()
-        self.is_last_guessed = False
+        # Elemzés nélküli tokenek legjobb lemmája (szóalak, tag) szerint (ld. cached_best_lemma).
+        self.best_lemmas = functools.lru_cache(maxsize=lemma_cache_size)(self.cached_best_lemma)
+        self.lemma_cache_state = None
+        self.check_lemma_cache()
+
+    @contextlib.contextmanager
+    def request_scope(self, sentences: list=()):
+        # ... és a kérés szavainak morfológiai elemzései. Csak az elemzőhöz kerül a szó, amit a
+        # word_classes és a best_lemmas cache nem tud (ezért nincs előre, kötegben elemzés).
+        with super().request_scope(sentences), SentenceAnalysis():
+            yield
+
+    def check_lemma_cache(self):
+        # A lemma cache a modelltől és a konfigurációtól (súly) függ. Ha ezek lecserélődtek, a
+        # comparatort újra kell építeni, és a cache-t üríteni.
+        conf = self.context.configuration
+        state = self.lemma_cache_state
+        if state is None or state[0] is not self.model or state[1] is not conf or \
+                state[2] != conf.weight:
+            self.lemma_comparator = LemmaComparator(self.model.compiled_data, self.model.data,
+                                                    conf.weight)
+            self.best_lemmas.cache_clear()
+            self.lemma_cache_state = (self.model, conf, conf.weight)
+
+    def lemma_cache_info(self):
+        # A lemma cache találatai és hibái (hits, misses, maxsize, currsize).
+        return self.best_lemmas.cache_info()
 
-    def merge(self, sentence: list, tags: list) -> list:
+    def merge(self, sentence: list, tags: list, user_anals: AnalysisQueue=None) -> list:
+        self.check_lemma_cache()
         res = super().merge(sentence, tags)
         tmp = []
         pos = 0
         for t in res:
-            best_stemmed_token = self.find_best_lemma(t, pos)
+            best_stemmed_token, is_guessed = self.find_best_lemma(t, pos, user_anals)
             best_stemmed_token = Token(best_stemmed_token.token,
-                                       self.mark_guessed(best_stemmed_token.stem.replace(" ", "_")),
+                                       self.mark_guessed(best_stemmed_token.stem.replace(" ", "_"),
+                                                         is_guessed),
                                        best_stemmed_token.tag)
             tmp.append(best_stemmed_token)
             pos += 1
         return Sentence(tmp)
 
-    def mark_guessed(self, lemma: str) -> str:
-        if self.is_last_guessed and util.CONFIGURATION is not None:
-            return util.CONFIGURATION.guessed_lemma_marker + lemma
+    def mark_guessed(self, lemma: str, is_guessed: bool) -> str:
+        if is_guessed:
+            return self.context.configuration.guessed_lemma_marker + lemma
         else:
             return lemma
 
-    @staticmethod
-    def simplify_lemma(tokens: list or set) -> list:
-        return [util.simplify_lemma(t) for t in tokens]
+    def simplify_lemma(self, tokens: list or set) -> list:
+        return [util.simplify_lemma(t, self.context.lemma_mapper) for t in tokens]
 
     @staticmethod
     def decode_lemma(tok: Token) -> Token:
@@ -164,27 +379,34 @@ class MorphTagger(POSTagger):
             return Token(tok.token, tok.original_stem, tok.tag)
         return tok
 
-    def find_best_lemma(self, t: Token, position: int) -> Token:
-        if util.analysis_queue.has_anal(position):
-            stems = self.simplify_lemma(util.analysis_queue.analysises(position))
-            self.is_last_guessed = False
-        else:
-            stems = self.analyser.analyse(t.token)
-            self.is_last_guessed = False
+    def find_best_lemma(self, t: Token, position: int, user_anals: AnalysisQueue=None) -> tuple:
+        # A legjobb lemmájú token, és hogy a lemma tippelt-e.
+        if user_anals is not None and user_anals.has_anal(position):
+            return self.best_lemma(t, self.simplify_lemma(user_anals.analysises(position)))
+        return self.best_lemmas(t.token, t.tag)
+
+    def cached_best_lemma(self, word: str, tag: str) -> tuple:
+        # Felhasználói elemzés nélkül az eredmény csak a szóalaktól és a tag-től függ (a modell, a
+        # konfiguráció és az elemző rögzített), ezért a best_lemmas LRU cache-ben újrahasznosítható.
+        # Az eredményt nem szabad módosítani!
+        return self.best_lemma(Token(word, None, tag), self.analyser.analyse(word))
+
+    def best_lemma(self, t: Token, stems: list) -> tuple:
+        is_guessed = False
 
         tag_log_probs = self.model.compiled_data.lemma_guesser.tag_log_probabilities(t.token)
         lemma_suff_probs = batch_convert(tag_log_probs, t.token, self.model.data.tag_vocabulary)
 
         use_morph = True
         if len(stems) == 0:
-            self.is_last_guessed = True
+            is_guessed = True
             use_morph = False
             stems = set(lemma_suff_probs.keys())
 
         possible_stems = [ct for ct in stems if t.tag == ct.tag]
 
         if len(possible_stems) == 0:
-            return Token(t.token, t.token, t.tag)
+            return Token(t.token, t.token, t.tag), is_guessed
 
         if len(possible_stems) == 1 and t.token == t.token.lower():
             best = possible_stems[0]
@@ -202,5 +424,5 @@ class MorphTagger(POSTagger):
                 if not use_morph:
                     lower_tok = Token(poss_tok.token, poss_tok.stem.lower(), poss_tok.tag)
                     comp.append((lower_tok, traf))
-            best = (max(comp, key=self.lemma_comparator))[0]
-        return self.decode_lemma(best)
+            best = self.lemma_comparator.best(comp, tag_log_probs)[0]
+        return self.decode_lemma(best), is_guessed
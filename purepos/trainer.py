@@ -26,23 +26,37 @@
 __author__ = 'morta@digitus.itk.ppke.hu'
 
 import io
-from corpusreader.corpus_reader import CorpusReader
+import multiprocessing
+from corpusreader.corpus_reader import CorpusReader, StreamedDocument
 from purepos.common.statistics import Statistics
 from purepos.model.rawmodel import RawModel
 from purepos.model.modeldata import ModelData
 
 
+# A párhuzamos tanítás munkafolyamatai a forkkal öröklik (ld. Trainer.count_parallel).
+_worker_document = None
+
+
+def _count_shard(start: int, end: int, orders: tuple) -> RawModel:
+    model = RawModel(ModelData.create(*orders))
+    model.add_sentences(_worker_document.range_sentences(start, end))
+    return model
+
+
 class Trainer:
     """Trainer class. Its role is to build a RawModel from the analysed input."""
-    def __init__(self, source: io.TextIOWrapper, reader: CorpusReader):
+    def __init__(self, source: io.TextIOWrapper, reader: CorpusReader, jobs: int=1):
         """Instantiates a Trainer object.
-        (In this version) it reads the whole input with the CorpusReader.
+        The input is not read into the memory: the training passes read it sentence by sentence
+        with the CorpusReader (see StreamedDocument).
         :param source: TextIOWrapper input
         :param reader: CorpusReader object to parse the input
+        :param jobs: The number of worker processes counting the shards of the corpus.
         """
         self.stat = Statistics()
         self.reader = reader
-        self.document = reader.read_from_io(source)  # todo egybe beolvassa a memóriába.
+        self.document = StreamedDocument(source, reader)
+        self.jobs = jobs
 
     def train(self, tag_order: int,
               emission_order: int,
@@ -52,6 +66,31 @@ class Trainer:
                                                           max_suffix_length, rare_frequency)))
 
     def train_model(self, raw_model: RawModel) -> RawModel:
-        raw_model.train(self.document)
+        shards = []
+        if self.jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+            shards = self.document.split(self.jobs)
+        if len(shards) > 1:
+            self.count_parallel(raw_model, shards)
+            raw_model.finish_training(self.document, self.jobs)
+        else:
+            raw_model.train(self.document, jobs=self.jobs)
         self.stat = raw_model.last_stat()
         return raw_model
+
+    def count_parallel(self, raw_model: RawModel, shards: list):
+        # Map-reduce: a korpusz egymást követő darabjait külön folyamatok számolják, az
+        # eredményeket sorrendben vonjuk össze (ld. RawModel.merge), így a modell ugyanaz, mintha
+        # egy menetben számoltuk volna.
+        global _worker_document
+        _worker_document = self.document
+        data = raw_model.data
+        orders = (data.tagging_order, data.emission_order, data.suffix_length,
+                  data.rare_frequency)
+        try:
+            with multiprocessing.get_context("fork").Pool(len(shards)) as pool:
+                results = [pool.apply_async(_count_shard, (start, end, orders))
+                           for start, end in shards]
+                for result in results:
+                    raw_model.merge(result.get())
+        finally:
+            _worker_document = None
@@ -0,0 +1,139 @@
+# -*- coding: utf-8, vim: expandtab:ts=4 -*-
+###############################################################################
+# Copyright (c) 2015 Móréh, Tamás
+# All rights reserved. This program and the accompanying materials
+# are made available under the terms of the GNU Lesser Public License v3
+# which accompanies this distribution, and is available at
+# http://www.gnu.org/licenses/
+#
+# This file is part of PurePos-Python3.
+#
+# PurePos-Python3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PurePos-Python3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser Public License for more details.
+#
+# Contributors:
+#     Móréh, Tamás - initial API and implementation
+##############################################################################
+
+
+__author__ = 'morta@digitus.itk.ppke.hu'
+
+import collections
+import io
+import math
+import multiprocessing
+import random
+import unittest
+from corpusreader.corpus_reader import CorpusReader
+from corpusreader.tokenreaders import StemmedTaggedTokenReader
+from docmodel.token import Token
+from purepos.cli.configuration import Configuration
+from purepos.common.util import Context
+from purepos.morphology import BaseMorphologicalAnalyser, CachingAnalyser
+from purepos.tagger import MorphTagger
+from purepos.trainer import Trainer
+from tests.test_concurrent_tagging import generate_corpus
+
+
+class CountingAnalyser(BaseMorphologicalAnalyser):
+    # Szóalakonként számolja, hányszor kérték tőle az elemzést.
+    def __init__(self, tags: dict):
+        self.table = tags
+        self.calls = collections.Counter()
+
+    def tags_and_analyses(self, word: str) -> tuple:
+        self.calls[word] += 1
+        tags = self.table.get(word, [])
+        return tags, [Token(word, word, tag) for tag in tags]
+
+    def tags(self, word: str) -> list:
+        return self.tags_and_analyses(word)[0]
+
+    def analyse(self, word: str) -> list:
+        return self.tags_and_analyses(word)[1]
+
+
+class AnalyserCallsTest(unittest.TestCase):
+    # A word_classes és a best_lemmas cache által ismert szavak nem kerülnek újra az elemzőhöz,
+    # akkor sem, ha a mondatok kötegben jönnek.
+    REPEATS = 3
+
+    @classmethod
+    def setUpClass(cls):
+        rnd = random.Random(20151017)
+        corpus = generate_corpus(rnd, 400)
+        trainer = Trainer(io.StringIO(corpus), CorpusReader(StemmedTaggedTokenReader("#", "\n")))
+        cls.conf = Configuration()
+        cls.model = trainer.train(2, 2, 10, 10).compile(cls.conf)
+        cls.sentences = [[token.split("#")[0] for token in line.split()]
+                         for line in generate_corpus(rnd, 60).splitlines()]
+        words = sorted({word for sentence in cls.sentences for word in sentence})
+        cls.table = {word: rnd.sample(["[N][0]", "[V][1]", "[Adj][2]"], rnd.randint(1, 2))
+                     for word in words[::3]}
+
+    def count_calls(self, batch_size: int, cache_size: int=0) -> list:
+        # Az elemző hívásainak száma az ismételt bemenet egyes menetei után.
+        analyser = CountingAnalyser(self.table)
+        ma = CachingAnalyser(analyser, cache_size) if cache_size > 0 else analyser
+        tagger = MorphTagger(self.model, ma, math.log(1000), math.log(10), 10, False,
+                             context=Context(self.conf))
+        ret = []
+        for _ in range(self.REPEATS):
+            tagger.tag_sentences(self.sentences, 1, batch_size)
+            ret.append(sum(analyser.calls.values()))
+        return ret
+
+    def test_batches_do_not_add_calls(self):
+        # Egy kérésen belül a szó első és nem első előfordulása is egy elemzésen osztozik, ezért
+        # kötegben legfeljebb annyi hívás lehet, mint mondatonként.
+        single = self.count_calls(1)
+        for batch_size in (8, 32):
+            batched = self.count_calls(batch_size)
+            self.assertTrue(all(b <= s for b, s in zip(batched, single)), (batched, single))
+
+    def test_repeated_input_is_not_analysed_again(self):
+        calls = self.count_calls(32)
+        self.assertEqual(calls, [calls[0]] * self.REPEATS)
+
+    def test_caching_analyser_lookups(self):
+        analyser = CachingAnalyser(CountingAnalyser(self.table), 100000)
+        tagger = MorphTagger(self.model, analyser, math.log(1000), math.log(10), 10, False,
+                             context=Context(self.conf))
+        lookups = []
+        for batch_size in (1, 32):
+            before = analyser.lookups
+            tagger.tag_sentences(self.sentences, 1, batch_size)
+            lookups.append(analyser.lookups - before)
+        # A második menetben minden szó a tagger cache-eiből jön.
+        self.assertEqual(lookups[1], 0)
+        self.assertEqual(analyser.misses, len(analyser.analyser.calls))
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "needs fork")
+    def test_parallel_statistics(self):
+        # A munkafolyamatok elemző statisztikája a szülő folyamat elemzőjébe gyűlik. Egyetlen
+        # darabban ugyanannyi, mint soros címkézéskor.
+        lines = "".join(" ".join(sentence) + "\n" for sentence in self.sentences)
+        counters = []
+        for jobs in (1, 2):
+            analyser = CachingAnalyser(CountingAnalyser(self.table), 100000)
+            tagger = MorphTagger(self.model, analyser, math.log(1000), math.log(10), 10, False,
+                                 context=Context(self.conf))
+            if jobs > 1:
+                tagger.tag_parallel(io.StringIO(lines), io.StringIO(), 1, 1, jobs,
+                                    len(self.sentences))
+            else:
+                tagger.tag(io.StringIO(lines), io.StringIO())
+            counters.append((analyser.lookups, analyser.misses))
+        self.assertGreater(counters[0][0], 0)
+        self.assertEqual(counters[1], counters[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8, vim: expandtab:ts=4 -*-
+###############################################################################
+# Copyright (c) 2015 Móréh, Tamás
+# All rights reserved. This program and the accompanying materials
+# are made available under the terms of the GNU Lesser Public License v3
+# which accompanies this distribution, and is available at
+# http://www.gnu.org/licenses/
+#
+# This file is part of PurePos-Python3.
+#
+# PurePos-Python3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PurePos-Python3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser Public License for more details.
+#
+# Contributors:
+#     Móréh, Tamás - initial API and implementation
+##############################################################################
+
+
+__author__ = 'morta@digitus.itk.ppke.hu'
+
+import io
+import math
+import random
+import threading
+import unittest
+from corpusreader.corpus_reader import CorpusReader
+from corpusreader.tokenreaders import StemmedTaggedTokenReader
+from purepos.cli.configuration import Configuration
+from purepos.common.util import Context
+from purepos.morphology import BaseMorphologicalAnalyser
+from purepos.tagger import MorphTagger, POSTagger
+from purepos.trainer import Trainer
+
+
+def generate_corpus(rnd: random.Random, sentences: int) -> str:
+    # Mesterséges word#lemma#tag korpusz: a tag-ek szuffixumot és a következő tag-et határozzák
+    # meg (kis modell, sok ismeretlen szóval a teszt mondatokban).
+    tags = ["[{}][{}]".format(pos, i) for pos in ("N", "V", "Adj", "Adv", "Det") for i in range(4)]
+    suffixes = {tag: "".join(rnd.choice("aeioukltnsr") for _ in range(rnd.randint(1, 3)))
+                for tag in tags}
+    following = {tag: rnd.sample(tags, 4) for tag in tags}
+    lines = []
+    for _ in range(sentences):
+        tag = rnd.choice(tags)
+        tokens = []
+        for _ in range(rnd.randint(3, 12)):
+            stem = "".join(rnd.choice("bdfgklmnprstvz") + rnd.choice("aeiou")
+                           for _ in range(rnd.randint(1, 3)))
+            tokens.append("{0}{1}#{0}#{2}".format(stem, suffixes[tag], tag))
+            tag = rnd.choice(following[tag])
+        lines.append(" ".join(tokens))
+    return "\n".join(lines) + "\n"
+
+
+class TableAnalyser(BaseMorphologicalAnalyser):
+    # A MorphologicalTable megfelelője fájl helyett egy {szó: [tag]} dict-ből.
+    def __init__(self, table: dict):
+        self.table = table
+
+    def tags(self, word: str) -> list:
+        return self.table.get(word, [])
+
+
+class ConcurrentTaggingTest(unittest.TestCase):
+    # Egy közös (lefordított modellű) tagger több szálból ugyanazt adja, mint sorban futtatva.
+    # Az elemző a modell által nem ismert tag-eket is ad (ld. VocabularyOverlay).
+    THREADS = 8
+    ROUNDS = 3
+    BATCH_SIZE = 5
+
+    @classmethod
+    def setUpClass(cls):
+        rnd = random.Random(20151017)
+        corpus = generate_corpus(rnd, 400)
+        trainer = Trainer(io.StringIO(corpus), CorpusReader(StemmedTaggedTokenReader("#", "\n")))
+        conf = Configuration()
+        cls.model = trainer.train(2, 2, 10, 10).compile(conf)
+        cls.sentences = [[token.split("#")[0] for token in line.split()]
+                         for line in generate_corpus(rnd, 120).splitlines()]
+        words = sorted({word for sentence in cls.sentences for word in sentence})
+        analyser = TableAnalyser({word: rnd.sample(
+            ["[N][0]", "[V][1]", "[Adj][2]", "[X][0]", "[X][1]", "[Y][2]"], rnd.randint(1, 3))
+            for word in words[::3]})
+        log_theta, suf_theta = math.log(1000), math.log(10)
+        cls.taggers = [
+            POSTagger(cls.model, analyser, log_theta, suf_theta, 10, False,
+                      context=Context(conf)),
+            MorphTagger(cls.model, analyser, log_theta, suf_theta, 10, False,
+                        context=Context(conf)),
+            MorphTagger(cls.model, analyser, log_theta, suf_theta, 10, True, beam_width=5,
+                        context=Context(conf, "/"))]
+
+    def tag(self, tagger: POSTagger, order: list, batched: bool) -> dict:
+        # {mondat sorszáma: a címkézett (2 legjobb) elemzés szövegként}
+        ret = dict()
+        if batched:
+            for start in range(0, len(order), self.BATCH_SIZE):
+                ids = order[start:start + self.BATCH_SIZE]
+                results = tagger.tag_batch([self.sentences[i] for i in ids], 2)
+                for i, result in zip(ids, results):
+                    ret[i] = tagger.sentences_to_string(result, True)
+        else:
+            for i in order:
+                ret[i] = tagger.sentences_to_string(tagger.tag_sentence(self.sentences[i], 2),
+                                                    True)
+        return ret
+
+    def test_threads_match_sequential_runs(self):
+        vocabulary_size = len(self.model.data.tag_vocabulary)
+        expected = [self.tag(tagger, list(range(len(self.sentences))), False)
+                    for tagger in self.taggers]
+        errors = []
+
+        def worker(seed: int):
+            rnd = random.Random(seed)
+            try:
+                for _ in range(self.ROUNDS):
+                    k = rnd.randrange(len(self.taggers))
+                    order = list(range(len(self.sentences)))
+                    rnd.shuffle(order)
+                    got = self.tag(self.taggers[k], order, rnd.random() < 0.5)
+                    differ = [i for i in order if got[i] != expected[k][i]]
+                    if len(differ) > 0:
+                        errors.append((seed, k, differ))
+            except Exception as e:
+                errors.append((seed, e))
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        # Az ismeretlen tag-ek nem kerültek a modell szótárába.
+        self.assertEqual(len(self.model.data.tag_vocabulary), vocabulary_size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8, vim: expandtab:ts=4 -*-
+###############################################################################
+# Copyright (c) 2015 Móréh, Tamás
+# All rights reserved. This program and the accompanying materials
+# are made available under the terms of the GNU Lesser Public License v3
+# which accompanies this distribution, and is available at
+# http://www.gnu.org/licenses/
+#
+# This file is part of PurePos-Python3.
+#
+# PurePos-Python3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PurePos-Python3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser Public License for more details.
+#
+# Contributors:
+#     Móréh, Tamás - initial API and implementation
+##############################################################################
+
+
+__author__ = 'morta@digitus.itk.ppke.hu'
+
+import random
+import unittest
+from purepos.common.spectokenmatcher import SpecTokenMatcher
+
+
+class SpecTokenMatcherTest(unittest.TestCase):
+    # Az egymenetes match_lexical_element a minták egyenkénti kipróbálásával egyezik meg.
+    EDGE_CASES = ["", "0", "12", "12.", "1.", "12.5", "1,000", "1:2", "1-2", "1-", "-1", "12a",
+                  "12abc", "12abcd", "12Ab", "12é", "&", "&amp;", "&amp", "&;", "a&b;", ".", "...",
+                  "!?", "-", "§", "/", "§1", "1/2", "«»", "—", "…", "a", "alma", "Alma", "kutya.",
+                  "12\n", ".\n", "\n", "12 ", " 12", "١٢", "１２", "𝟙𝟚", "😀", "&😀;", "1.2.3."]
+    ALPHABET = "0123456789.,:-&;!?()[]§/ aAzZéŐ\n١𝟙😀" + SpecTokenMatcher.punct_chars
+
+    def assert_same(self, token: str):
+        self.assertEqual(SpecTokenMatcher.match_lexical_element(token),
+                         SpecTokenMatcher.match_lexical_element_ordered(token), repr(token))
+
+    def test_edge_cases(self):
+        for token in self.EDGE_CASES:
+            self.assert_same(token)
+
+    def test_random_tokens(self):
+        rnd = random.Random(12345)
+        for _ in range(20000):
+            self.assert_same("".join(rnd.choice(self.ALPHABET)
+                                     for _ in range(rnd.randint(1, 8))))
+
+    def test_every_class_is_found(self):
+        classes = {SpecTokenMatcher.match_lexical_element(token) for token in self.EDGE_CASES}
+        for name, *_ in SpecTokenMatcher.cls_pat_list:
+            self.assertIn(name, classes)
+
+
+if __name__ == '__main__':
+    unittest.main()